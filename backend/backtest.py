@@ -0,0 +1,206 @@
+# In: backend/backtest.py
+#
+# Offline replay: scores every row of a historical feature table (training_dataset.csv or
+# the Parquet dataset from backend/build_dataset.py) with no network access.
+#
+#   python -m backend.backtest --input training_dataset.csv --output data/backtest/scores.parquet
+#   python -m backend.backtest --input data/training_dataset --contributions --load-db
+#
+# Rows are split into chunks scored in parallel worker processes, each holding its own
+# memory-mapped copy of the model, so throughput scales with the CPU count.
+
+import os
+import io
+import csv
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+from backend.db import run_query
+from backend.model_registry import ModelVersion, resolve, REGISTRY_PATH, MODEL_FILE
+from backend.scoring_engine import to_scores
+from backend.score_store import point_row, copy_points, ensure_partitions, maintain
+
+DEFAULT_OUTPUT = os.path.join("data", "backtest", "scores.parquet")
+
+# Rows per task; small enough to balance SHAP work across workers, large enough to vectorize
+CHUNK_SIZE = int(os.getenv("BACKTEST_CHUNK_SIZE", 5000))
+
+CONTRIBUTION_PREFIX = "shap_"
+
+_worker_model = None
+
+
+def _init_worker(version: str, path: str):
+    global _worker_model
+    _worker_model = ModelVersion(version, path)
+
+
+def _score_chunk(values: np.ndarray, contributions: bool) -> tuple:
+    """Predictions (and SHAP values with the base value) for one chunk, in a worker process."""
+    features_df = pd.DataFrame(values, columns=_worker_model.features)
+    predictions = _worker_model.predict(features_df)
+    if not contributions:
+        return predictions, None, None
+    explainer = _worker_model.explainer()
+    return predictions, np.asarray(explainer.shap_values(features_df)), float(explainer.expected_value[0])
+
+
+def load_history(path: str) -> pd.DataFrame:
+    """Reads a feature table from a CSV file or a (partitioned) Parquet dataset."""
+    if os.path.isdir(path) or path.endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+    if 'ticker' in df.columns:
+        df['ticker'] = df['ticker'].astype(str)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def resolve_version(version: str = None) -> tuple:
+    """(version, pickle path) for a registry version, or for the serving model when None."""
+    if version is None:
+        return resolve()
+    path = os.path.join(REGISTRY_PATH, version, MODEL_FILE)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Version '{version}' is not in the registry at '{REGISTRY_PATH}'.")
+    return version, path
+
+
+def replay(history: pd.DataFrame, version: str = None, contributions: bool = False,
+           workers: int = None, chunk_size: int = CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Scores every row of `history`. Returns date, ticker, score, prediction and model_version
+    per row (in input order), plus base_value and one shap_<feature> column per feature
+    when `contributions` is set.
+    """
+    # Loading once here compiles the model if needed, so the workers only memory-map it
+    model = ModelVersion(*resolve_version(version))
+    features = model.features
+    values = history.reindex(columns=features, fill_value=0).fillna(0).to_numpy(dtype='float64')
+    chunks = [values[start:start + chunk_size] for start in range(0, len(values), chunk_size)]
+
+    if workers == 1 or len(chunks) <= 1:
+        global _worker_model
+        _worker_model = model
+        results = [_score_chunk(chunk, contributions) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model.version, model.path)) as executor:
+            results = list(executor.map(_score_chunk, chunks, [contributions] * len(chunks)))
+
+    predictions = np.concatenate([result[0] for result in results]) if results else np.empty(0)
+    scored = pd.DataFrame({
+        'date': history['date'].to_numpy() if 'date' in history.columns else pd.NaT,
+        'ticker': history['ticker'].to_numpy() if 'ticker' in history.columns else None,
+        'score': to_scores(predictions),
+        'prediction': predictions,
+        'model_version': model.version,
+    })
+    if contributions and results:
+        scored['base_value'] = results[0][2]
+        shap_values = np.concatenate([result[1] for result in results])
+        for i, name in enumerate(features):
+            scored[f"{CONTRIBUTION_PREFIX}{name}"] = shap_values[:, i]
+    return scored
+
+
+def write_scores(scored: pd.DataFrame, output: str):
+    """Writes the score time series as Parquet, or CSV when the path ends in .csv."""
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    if output.endswith('.csv'):
+        scored.to_csv(output, index=False)
+    else:
+        scored.to_parquet(output, index=False)
+
+
+def _copy_scores(cur, buffer: io.StringIO, points: io.StringIO):
+    cur.copy_expert(
+        "COPY credit_scores (ticker, score, features, explanation, model_version, created_at) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+    # As with live writes, a failed typed copy keeps the credit_scores rows
+    copy_points(cur, points)
+
+
+def load_into_db(scored: pd.DataFrame, history: pd.DataFrame, batch_rows: int = 50000) -> int:
+    """
+    Bulk-loads replayed scores into credit_scores and score_points with COPY, dated by
+    their history date, then rebuilds the rollups from the first date. Features and
+    explanations are stored in the same layouts as live scores. No retention is applied
+    here, so every loaded row stays in credit_scores.
+    """
+    features = [name[len(CONTRIBUTION_PREFIX):] for name in scored.columns if name.startswith(CONTRIBUTION_PREFIX)]
+    feature_columns = [name for name in history.columns if name not in ('date', 'ticker')]
+    feature_records = history[feature_columns].fillna(0).to_dict(orient='records')
+    if scored.empty:
+        return 0
+    dates = pd.to_datetime(scored['date'])
+    run_query(ensure_partitions, dates.min().to_pydatetime(), dates.max().to_pydatetime())
+    loaded = 0
+    for start in range(0, len(scored), batch_rows):
+        batch = scored.iloc[start:start + batch_rows]
+        buffer, points = io.StringIO(), io.StringIO()
+        writer, point_writer = csv.writer(buffer), csv.writer(points)
+        contributions = batch[[f"{CONTRIBUTION_PREFIX}{name}" for name in features]].to_numpy() if features else None
+        for i, row in enumerate(batch.itertuples(index=False)):
+            explanation = None
+            if contributions is not None:
+                explanation = {
+                    "base_value": round(row.base_value, 5),
+                    "prediction": round(row.prediction, 5),
+                    "contributions": {name: round(float(value), 5) for name, value in zip(features, contributions[i])},
+                }
+            created_at = pd.Timestamp(row.date).strftime('%Y-%m-%d %H:%M:%S')
+            writer.writerow([
+                row.ticker, int(row.score), json.dumps(feature_records[start + i]), json.dumps(explanation),
+                row.model_version, created_at,
+            ])
+            point_writer.writerow(point_row(None, row.ticker, created_at, row.score, feature_records[start + i], explanation, row.model_version))
+        buffer.seek(0)
+        points.seek(0)
+        run_query(_copy_scores, buffer, points)
+        loaded += len(batch)
+        print(f"Loaded {loaded}/{len(scored)} scores into credit_scores.")
+    since = dates.min().to_pydatetime()
+    result = maintain(since=since, retention=False)
+    if result is None:
+        print(f"⚠️ Score maintenance is busy; run `python -m backend.score_store rollup --since {since:%Y-%m-%d}` to roll up these scores.")
+    else:
+        print(f"✅ Rolled up the loaded scores: {result}")
+    return loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay historical feature rows through the credit model.")
+    parser.add_argument("--input", default="training_dataset.csv", help="Feature table: CSV file or Parquet dataset.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Scores file, .parquet or .csv (default: %(default)s).")
+    parser.add_argument("--version", help="Registry version to replay (default: the serving model).")
+    parser.add_argument("--contributions", action="store_true", help="Also compute SHAP contributions per row.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per task (default: %(default)s).")
+    parser.add_argument("--load-db", action="store_true", help="Bulk-load the scores into credit_scores.")
+    args = parser.parse_args(argv)
+
+    history = load_history(args.input)
+    start = time.perf_counter()
+    scored = replay(history, args.version, args.contributions, args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Scored {len(scored)} rows with {scored['model_version'].iat[0] if len(scored) else 'no model'} "
+          f"in {elapsed:.2f}s ({len(scored) / max(elapsed, 1e-9):,.0f} rows/s).")
+
+    write_scores(scored, args.output)
+    print(f"✅ Wrote scores to '{args.output}'.")
+    if args.load_db:
+        load_into_db(scored, history)
+
+
+if __name__ == '__main__':
+    main()
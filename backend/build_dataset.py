@@ -0,0 +1,204 @@
+# In: backend/build_dataset.py
+#
+# Builds the model training dataset (what notebooks/02 used to produce) as a CLI:
+#
+#   python -m backend.build_dataset --tickers AAPL,MSFT,GOOGL --period 5y
+#   python -m backend.build_dataset --tickers-file universe.txt --offline --csv training_dataset.csv
+#
+# Rows are written as Parquet partitioned by ticker. Re-running only appends dates newer
+# than the last build, and every feature is computed with the same code the live scoring
+# path uses, so training and serving see identical values: prices through the same rolling
+# means, news over the same trailing window of stored articles, macro data point in time.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+from data_ingestion.price_store import price_store, FIELDS
+from data_ingestion.news_fetcher import fetch_news_headlines
+from data_ingestion.news_store import news_store, WINDOW_DAYS, WINDOW_ARTICLES
+from data_ingestion.fred_fetcher import fetch_macro_history, macro_cache, SERIES
+from backend.scoring_engine import trend_indicators
+from common.sentiment import trailing_news_features
+
+# Column order of training_dataset.csv (the model's features, plus date and ticker)
+COLUMNS = ['date', *FIELDS, 'ticker', 'trend_indicator', 'sentiment', 'positive_events', 'negative_events', *SERIES]
+NEWS_COLUMNS = ['sentiment', 'positive_events', 'negative_events']
+
+DEFAULT_OUTPUT = os.path.join("data", "training_dataset")
+MANIFEST_FILE = "_manifest.json"   # ticker -> last date written
+
+
+def build_ticker(ticker: str, since, news_records: list, macro_history: pd.DataFrame, macro_latest: dict) -> pd.DataFrame:
+    """
+    Feature rows for one ticker from its stored price history, for dates after `since`
+    (None for all). Runs in a worker process.
+    """
+    stored = price_store.read(ticker)
+    if stored is None or len(stored[0]) == 0:
+        return pd.DataFrame(columns=COLUMNS)
+    dates, ohlcv = stored
+    frame = pd.DataFrame(np.asarray(ohlcv).T, columns=FIELDS)
+    frame.insert(0, 'date', pd.DatetimeIndex(dates.astype('datetime64[ns]')))
+    frame['ticker'] = ticker
+    # Rolling means over the full stored history, exactly as the live feature state keeps them
+    frame['trend_indicator'] = trend_indicators(frame['Close'])
+
+    # News as live scoring would have seen it at the end of each day: the newest
+    # WINDOW_ARTICLES published in the WINDOW_DAYS before it
+    news = trailing_news_features(news_records, frame['date'] + pd.Timedelta(days=1), WINDOW_DAYS, WINDOW_ARTICLES)
+    for name in NEWS_COLUMNS:
+        frame[name] = news[name].to_numpy()
+
+    if not macro_history.empty:
+        # Point in time: the history is indexed by release date, so each date gets the values
+        # live scoring could have seen that day
+        # (FRED's index may come back in another datetime unit; merge_asof needs both keys alike)
+        macro_history = macro_history.set_axis(macro_history.index.astype('datetime64[ns]'))
+        frame = pd.merge_asof(frame, macro_history.rename_axis('date').reset_index(), on='date', direction='backward')
+    for name in SERIES:
+        if name not in frame.columns:
+            frame[name] = (macro_latest or {}).get(name, 0)
+        # Missing indicators default to 0, as in engineer_features
+        frame[name] = frame[name].fillna(0)
+
+    if since is not None:
+        frame = frame[frame['date'] > pd.Timestamp(since)]
+    return frame[COLUMNS]
+
+
+def load_manifest(output: str) -> dict:
+    try:
+        with open(os.path.join(output, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(output: str, manifest: dict):
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, MANIFEST_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def write_rows(output: str, rows: pd.DataFrame):
+    """Appends rows as new Parquet files under output/ticker=<TICKER>/."""
+    rows.to_parquet(output, partition_cols=['ticker'], index=False)
+
+
+def stored_news(ticker: str) -> list:
+    """Every article the news store holds for a ticker, with its stored scores."""
+    news = news_store.articles(f"{ticker} company")
+    return news[['publishedAt', 'title', 'sentiment', 'positive_event', 'negative_event']].to_dict(orient='records')
+
+
+def fetch_inputs(tickers: list, period: str, offline: bool):
+    """
+    Brings prices and the news store up to date and fetches macro history. Offline, only
+    stored prices, stored news and cached macro values are used.
+    """
+    if offline:
+        return {ticker: stored_news(ticker) for ticker in tickers}, pd.DataFrame(), macro_cache.peek()
+
+    # One batched, rate-limited download for every ticker that needs bars
+    price_store.update(tickers, period=period)
+
+    def news_for(ticker):
+        # Refreshes the store; the dataset then uses all stored history, not just this page
+        fetch_news_headlines(query=f"{ticker} company")
+        return stored_news(ticker)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        news = dict(zip(tickers, executor.map(news_for, tickers)))
+
+    first_dates = [price_store.read(ticker)[0][0] for ticker in tickers if price_store.last_date(ticker) is not None]
+    macro_history = fetch_macro_history(min(first_dates)) if first_dates else pd.DataFrame()
+    if macro_history.empty:
+        print("⚠️ No FRED history available: using the latest macro values for every date.")
+    return news, macro_history, macro_cache.get()
+
+
+def build_dataset(tickers: list, output: str = DEFAULT_OUTPUT, period: str = "1y", workers: int = None,
+                  offline: bool = False, rebuild: bool = False) -> int:
+    """Builds or extends the dataset for `tickers`. Returns the number of rows written."""
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers if ticker.strip()))
+    manifest = {} if rebuild else load_manifest(output)
+    if rebuild:
+        for ticker in tickers:
+            shutil.rmtree(os.path.join(output, f"ticker={ticker}"), ignore_errors=True)
+        manifest = {ticker: last for ticker, last in load_manifest(output).items() if ticker not in tickers}
+
+    start = time.perf_counter()
+    news, macro_history, macro_latest = fetch_inputs(tickers, period, offline)
+    print(f"Inputs ready in {time.perf_counter() - start:.1f}s. Building features for {len(tickers)} tickers...")
+
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            ticker: executor.submit(build_ticker, ticker, manifest.get(ticker), news[ticker], macro_history, macro_latest)
+            for ticker in tickers
+        }
+        for ticker, future in futures.items():
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"❌ Failed to build {ticker}: {e}")
+                continue
+            if rows.empty:
+                print(f"{ticker}: up to date.")
+                continue
+            write_rows(output, rows)
+            manifest[ticker] = rows['date'].max().strftime('%Y-%m-%d')
+            save_manifest(output, manifest)
+            written += len(rows)
+            print(f"✅ {ticker}: {len(rows)} new rows through {manifest[ticker]}.")
+
+    print(f"Wrote {written} rows in {time.perf_counter() - start:.1f}s to '{output}'.")
+    return written
+
+
+def export_csv(output: str, csv_path: str):
+    """Writes the whole dataset as one CSV in the layout notebooks/03 reads."""
+    df = pd.read_parquet(output)
+    df['ticker'] = df['ticker'].astype(str)
+    df = df.sort_values(['ticker', 'date'])[COLUMNS]
+    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+    df.to_csv(csv_path, index=False)
+    print(f"✅ Exported {len(df)} rows to '{csv_path}'.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the training dataset as partitioned Parquet.")
+    parser.add_argument("--tickers", help="Comma-separated ticker symbols.")
+    parser.add_argument("--tickers-file", help="File with one ticker per line.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Dataset directory (default: %(default)s).")
+    parser.add_argument("--period", default="1y", help="History to backfill for tickers not yet in the price store.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--offline", action="store_true", help="Use stored prices and cached macro data only.")
+    parser.add_argument("--rebuild", action="store_true", help="Rewrite the given tickers from scratch.")
+    parser.add_argument("--csv", help="Also export the full dataset to this CSV file.")
+    args = parser.parse_args(argv)
+
+    tickers = args.tickers.split(',') if args.tickers else []
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if not tickers:
+        parser.error("Provide --tickers or --tickers-file.")
+
+    build_dataset(tickers, args.output, args.period, args.workers, args.offline, args.rebuild)
+    if args.csv:
+        export_csv(args.output, args.csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+# In: backend/db.py
+
+import os
+import json
+import time
+import queue
+import atexit
+import asyncio
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from common.metrics import span
+
+load_dotenv()
+
+POOL_MIN_CONNECTIONS = int(os.getenv("DB_POOL_MIN", 1))
+POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX", 10))
+
+# Write-behind settings: flush when this many scores are queued, or after this many seconds
+WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", 100))
+WRITE_FLUSH_SECONDS = float(os.getenv("DB_WRITE_FLUSH_SECONDS", 2))
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+
+
+def _connection_params() -> dict:
+    return {
+        "host": os.getenv("DB_HOST"),
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+    }
+
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pool.ThreadedConnectionPool(POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **_connection_params())
+        return _pool
+
+
+def connect_dedicated():
+    """Opens a connection outside the pool, for long-lived uses such as LISTEN."""
+    return psycopg2.connect(**_connection_params())
+
+
+@contextmanager
+def get_connection():
+    """
+    Borrows a pooled connection for the duration of the block. Commits on success,
+    rolls back on error, and always returns the connection to the pool.
+    """
+    with _pool_slots:
+        db_pool = get_pool()
+        conn = db_pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except psycopg2.Error:
+            broken = conn.closed != 0
+            if not broken:
+                conn.rollback()
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            db_pool.putconn(conn, close=broken)
+
+
+def run_query(func, *args):
+    """Runs func(cursor, *args) on a pooled connection and returns its result."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            return func(cur, *args)
+
+
+async def run_query_async(func, *args):
+    """Async variant of run_query for FastAPI handlers: the blocking I/O runs off the event loop."""
+    return await asyncio.to_thread(run_query, func, *args)
+
+
+def _insert_scores(cur, rows: list):
+    """
+    Inserts queued scores into credit_scores and their typed copies into score_points.
+    rows are (ticker, score, features_json, explanation_json, model_version, features, explanation).
+    """
+    # Imported here because score_store imports this module
+    from backend.score_store import point_row, insert_points
+    returned = execute_values(
+        cur,
+        "INSERT INTO credit_scores (ticker, score, features, explanation, model_version) VALUES %s RETURNING id, created_at",
+        [row[:5] for row in rows],
+        page_size=WRITE_BATCH_SIZE,
+        fetch=True
+    )
+    points = [
+        point_row(score_id, row[0], created_at, row[1], row[5], row[6], row[4])
+        for (score_id, created_at), row in zip(returned, rows)
+    ]
+    insert_points(cur, points)
+
+
+class ScoreWriter:
+    """
+    Write-behind queue for credit_scores inserts. Scores are buffered in memory and a
+    background thread writes them in batches with a single multi-row INSERT.
+    """
+
+    def __init__(self, batch_size: int = WRITE_BATCH_SIZE, flush_seconds: float = WRITE_FLUSH_SECONDS):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="score-writer", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, ticker: str, score: int, features: dict, explanation, model_version: str = None):
+        """Queues a score for insertion and returns immediately."""
+        self._queue.put((ticker.upper(), score, json.dumps(features), json.dumps(explanation), model_version, features, explanation))
+        self._ensure_started()
+
+    def _next_batch(self) -> list:
+        """Waits for a score, then keeps collecting until the batch is full or the flush interval ends."""
+        rows = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, rows: list):
+        try:
+            with span("db_insert"):
+                run_query(_insert_scores, rows)
+            print(f"Successfully saved {len(rows)} scores to the database.")
+        except Exception as e:
+            print(f"Database error while saving {len(rows)} scores: {e}")
+        finally:
+            for _ in rows:
+                self._queue.task_done()
+
+    def _run(self):
+        while True:
+            self._write(self._next_batch())
+
+    def flush(self):
+        """Blocks until every queued score has been written (or failed)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+        else:
+            rows = []
+            while True:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for start in range(0, len(rows), self.batch_size):
+                self._write(rows[start:start + self.batch_size])
+
+
+score_writer = ScoreWriter()
+atexit.register(score_writer.flush)
+
+
+def enqueue_score(ticker: str, score: int, features: dict, explanation, model_version: str = None):
+    """Queues a score for a batched insert into credit_scores."""
+    score_writer.enqueue(ticker, score, features, explanation, model_version)
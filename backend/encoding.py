@@ -0,0 +1,133 @@
+# In: backend/encoding.py
+
+import json
+import hashlib
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library encoder
+    orjson = None
+
+# Sections of a /data response that can be selected with ?fields=
+SECTIONS = ('score', 'features', 'market', 'news', 'macro')
+
+# Encoded responses are kept on the cached result under this key, at most this many views each
+ENCODED_VIEWS_KEY = '_encoded_views'
+MAX_ENCODED_VIEWS = 32
+
+
+def parse_fields(fields: str) -> set:
+    """Parses a comma-separated ?fields= value; None or empty selects every section."""
+    if not fields:
+        return set(SECTIONS)
+    selected = {field.strip().lower() for field in fields.split(',') if field.strip()}
+    unknown = selected - set(SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown fields {sorted(unknown)}; choose from {list(SECTIONS)}.")
+    return selected
+
+
+def records_to_columns(records: list) -> dict:
+    """Turns a list of row dicts into {column: [values...]}."""
+    columns = {}
+    for i, record in enumerate(records):
+        for key, value in record.items():
+            # Keys missing from earlier rows are padded with None
+            columns.setdefault(key, [None] * i).append(value)
+        for key, values in columns.items():
+            if len(values) <= i:
+                values.append(None)
+    return columns
+
+
+def columns_to_records(columns: dict) -> list:
+    """Turns {column: [values...]} into a list of row dicts."""
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def shape_result(result: dict, sections: set, market_days: int = None, shape: str = 'records') -> dict:
+    """
+    Builds the /data response from a full result, keeping only the selected sections.
+    The result's market data is held column-wise; `market_days` keeps the latest rows only
+    and shape='columnar' returns market data and news as arrays per column.
+    """
+    response = {"ticker": result["ticker"]}
+    if 'score' in sections:
+        response["credit_score"] = result["credit_score"]
+    if 'features' in sections:
+        response["features"] = result["features"]
+    if 'score' in sections:
+        response["degraded_sources"] = result["degraded_sources"]
+
+    raw_data = result["raw_data"]
+    shaped = {}
+    if 'market' in sections:
+        market = raw_data["market_data"]
+        if market_days is not None:
+            market = {name: values[-market_days:] for name, values in market.items()}
+        shaped["market_data"] = market if shape == 'columnar' else columns_to_records(market)
+    if 'news' in sections:
+        news = raw_data["news"]
+        shaped["news"] = records_to_columns(news) if shape == 'columnar' else news
+    if 'macro' in sections:
+        shaped["macro_data"] = raw_data["macro_data"]
+    if shaped:
+        response["raw_data"] = shaped
+    return response
+
+
+def dumps(content) -> bytes:
+    """Serializes to JSON bytes with orjson when available (NaN becomes null either way)."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_nan_to_none(content), separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _nan_to_none(value):
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, dict):
+        return {key: _nan_to_none(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_nan_to_none(item) for item in value]
+    return value
+
+
+def encode(content) -> tuple:
+    """
+    Returns (body, etag) for content. The tag is weak: GZipMiddleware may compress the body
+    after it is computed, and gzip and identity responses carry the same tag.
+    """
+    body = dumps(content)
+    return body, 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def encode_view(result: dict, view: tuple, build) -> tuple:
+    """
+    Returns encode(build()) for one view of a cached result (e.g. its selected fields and
+    shape), encoding each view once per result so repeat polls skip serialization.
+    """
+    views = result.setdefault(ENCODED_VIEWS_KEY, {})
+    encoded = views.get(view)
+    if encoded is None:
+        encoded = encode(build())
+        if len(views) < MAX_ENCODED_VIEWS:
+            views[view] = encoded
+    return encoded
+
+
+def json_response(request: Request, content=None, headers: dict = None, encoded: tuple = None) -> Response:
+    """
+    Encodes content as JSON with an ETag (or sends an already encoded (body, etag)). A request
+    whose If-None-Match carries the same tag gets an empty 304, so repeat polls of an
+    unchanged result cost no body.
+    """
+    body, etag = encoded if encoded is not None else encode(content)
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache"}
+    # Weak comparison (RFC 9110): W/ prefixes are ignored on both sides
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag.removeprefix('W/') in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,164 @@
+# In: backend/explanations.py
+
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from psycopg2.extras import execute_values
+from backend.db import run_query, run_query_async
+from common.metrics import span
+from backend.model_registry import model_manager
+from backend.scoring_engine import explain_many
+from backend.score_store import point_row, insert_points, update_point_explanations
+
+# SHAP runs on a small dedicated pool so it never competes with request threads
+EXPLAIN_WORKERS = int(os.getenv("EXPLAIN_WORKERS", 2))
+
+# Recent deferred results kept in memory for /explanation lookups
+TRACKED_EXPLANATIONS = 10000
+
+# credit_scores.explanation of a deferred score until its job stores the result (JSON null: none available)
+PENDING = {"status": "pending"}
+
+# A score still pending after this long is reported unavailable: its job was lost (e.g. the process restarted)
+PENDING_TIMEOUT_SECONDS = float(os.getenv("EXPLANATION_PENDING_TIMEOUT_SECONDS", 600))
+
+
+def _insert_scores_returning_ids(cur, rows: list, feature_records: list) -> list:
+    returned = execute_values(
+        cur,
+        "INSERT INTO credit_scores (ticker, score, features, explanation, model_version) VALUES %s RETURNING id, created_at",
+        rows,
+        fetch=True
+    )
+    insert_points(cur, [
+        point_row(score_id, row[0], created_at, row[1], features, None, row[4])
+        for (score_id, created_at), row, features in zip(returned, rows, feature_records)
+    ])
+    return [row[0] for row in returned]
+
+
+def _update_explanations(cur, explanations: list):
+    """Stores a job's results, [(score_id, explanation or None)], with one UPDATE per table."""
+    execute_values(
+        cur,
+        "UPDATE credit_scores AS c SET explanation = v.explanation FROM (VALUES %s) AS v (id, explanation) WHERE c.id = v.id",
+        [(score_id, json.dumps(explanation)) for score_id, explanation in explanations],
+        template="(%s::BIGINT, %s::JSONB)"
+    )
+    update_point_explanations(cur, [(score_id, explanation) for score_id, explanation in explanations if explanation])
+
+
+def _fetch_explanation(cur, score_id: int):
+    cur.execute("SELECT explanation, created_at FROM credit_scores WHERE id = %s", (score_id,))
+    return cur.fetchone()
+
+
+class DeferredExplainer:
+    """
+    Computes SHAP explanations off the request path. Scores are inserted straight away
+    (so callers get a score_id) with a PENDING explanation, then a worker fills in
+    credit_scores.explanation for the whole batch with one UPDATE.
+    """
+
+    def __init__(self, workers: int = EXPLAIN_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shap")
+        self._status = OrderedDict()   # score_id -> Future or finished explanation
+        self._lock = threading.Lock()
+
+    def _track(self, score_id: int, entry):
+        with self._lock:
+            self._status[score_id] = entry
+            self._status.move_to_end(score_id)
+            while len(self._status) > TRACKED_EXPLANATIONS:
+                self._status.popitem(last=False)
+
+    def _explain_and_store(self, score_ids: list, features_df: pd.DataFrame, predictions: list, version: str = None):
+        try:
+            # Explain with the version that scored the rows, even if a newer one went live since
+            explanations = explain_many(features_df, predictions, model_manager.version(version))
+        except Exception:
+            # Mark the rows as having no explanation, so other processes stop reporting them pending
+            self._store(list(zip(score_ids, [None] * len(score_ids))))
+            raise
+        self._store(list(zip(score_ids, explanations)))
+        for score_id, explanation in zip(score_ids, explanations):
+            self._track(score_id, explanation)
+        return explanations
+
+    @staticmethod
+    def _store(explanations: list):
+        try:
+            with span("db_insert"):
+                run_query(_update_explanations, explanations)
+        except Exception as e:
+            print(f"Database error while saving {len(explanations)} explanations: {e}")
+
+    def submit(self, tickers: list, results: list, features_df: pd.DataFrame) -> list:
+        """
+        Saves the scores without explanations and schedules one batched SHAP job for them.
+        Returns the new score ids, in row order.
+        """
+        feature_records = features_df.to_dict(orient='records')
+        rows = [
+            (ticker.upper(), result['score'], json.dumps(features), json.dumps(PENDING), result.get('model_version'))
+            for ticker, result, features in zip(tickers, results, feature_records)
+        ]
+        with span("db_insert"):
+            score_ids = run_query(_insert_scores_returning_ids, rows, feature_records)
+        future = self._executor.submit(
+            self._explain_and_store, score_ids, features_df, [result['prediction'] for result in results],
+            results[0].get('model_version') if results else None
+        )
+        with self._lock:
+            for score_id in score_ids:
+                # A memoized explanation may already have finished and been tracked
+                self._status.setdefault(score_id, future)
+        return score_ids
+
+    def _local_status(self, score_id: int):
+        """The status of a job submitted by this process, or None if it has none."""
+        with self._lock:
+            entry = self._status.get(score_id)
+        if entry is not None and not isinstance(entry, dict):
+            if not entry.done():
+                return {"status": "pending", "explanation": None}
+            if entry.exception() is not None:
+                return {"status": "unavailable", "explanation": None}
+            with self._lock:
+                entry = self._status.get(score_id)
+        if isinstance(entry, dict):
+            return {"status": "ready", "explanation": entry}
+        return None
+
+    @staticmethod
+    def _stored_status(row):
+        """The status of a score from its credit_scores row, or None if there is no such score."""
+        if row is None:
+            return None
+        explanation, created_at = json.loads(row[0]) if isinstance(row[0], str) else row[0], row[1]
+        if explanation == PENDING:
+            # Scheduled by this or another process; only a lost job stays pending past the timeout
+            if created_at.tzinfo is not None:
+                created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+            age = (datetime.now(timezone.utc).replace(tzinfo=None) - created_at).total_seconds()
+            if age < PENDING_TIMEOUT_SECONDS:
+                return {"status": "pending", "explanation": None}
+            explanation = None
+        if explanation is None:
+            return {"status": "unavailable", "explanation": None}
+        return {"status": "ready", "explanation": explanation}
+
+    def status(self, score_id: int) -> dict:
+        """Returns {"status": "pending"|"ready"|"unavailable", "explanation": ...} or None if unknown."""
+        return self._local_status(score_id) or self._stored_status(run_query(_fetch_explanation, score_id))
+
+    async def status_async(self, score_id: int) -> dict:
+        """status() for async handlers: the database read runs off the event loop."""
+        return self._local_status(score_id) or self._stored_status(await run_query_async(_fetch_explanation, score_id))
+
+
+deferred_explainer = DeferredExplainer()
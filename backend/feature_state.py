@@ -0,0 +1,200 @@
+# In: backend/feature_state.py
+
+import math
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+from data_ingestion.price_store import price_store
+
+# Short- and long-term moving average windows behind trend_indicator
+SHORT_WINDOW = 30
+LONG_WINDOW = 90
+
+FIELDS = ['Close', 'High', 'Low', 'Open', 'Volume']
+
+
+class RollingMean:
+    """
+    O(1) rolling mean over a fixed window, updated one value at a time. Mirrors pandas'
+    Series.rolling(window).mean() step for step (Kahan-compensated add/remove, NaN
+    skipping, same-value and sign fix-ups), so fed the same series it returns the same
+    float as pandas, bit for bit.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.sum = 0.0
+        self.neg_ct = 0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.consecutive_same = 0
+        self.prev_value = None
+
+    def _add(self, val: float):
+        if val != val:
+            return
+        self.nobs += 1
+        y = val - self.compensation_add
+        t = self.sum + y
+        self.compensation_add = t - self.sum - y
+        self.sum = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct += 1
+        if self.prev_value is not None and val == self.prev_value:
+            self.consecutive_same += 1
+        else:
+            self.consecutive_same = 1
+        self.prev_value = val
+
+    def _remove(self, val: float):
+        if val != val:
+            return
+        self.nobs -= 1
+        y = -val - self.compensation_remove
+        t = self.sum + y
+        self.compensation_remove = t - self.sum - y
+        self.sum = t
+        if math.copysign(1.0, val) < 0:
+            self.neg_ct -= 1
+
+    def push(self, val: float):
+        """Slides the window forward by one value (removing first, then adding, as pandas does)."""
+        val = float(val)
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(val)
+        self._add(val)
+
+    @property
+    def mean(self) -> float:
+        if self.nobs < self.window or self.nobs == 0:
+            return float('nan')
+        result = self.sum / self.nobs
+        if self.consecutive_same >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+    def copy(self) -> 'RollingMean':
+        clone = RollingMean.__new__(RollingMean)
+        clone.__dict__.update(self.__dict__)
+        clone.values = deque(self.values)
+        return clone
+
+
+class TickerFeatureState:
+    """
+    Streaming price-feature state for one ticker: the latest bar plus the rolling means
+    behind trend_indicator. Bars are applied in date order; re-applying the latest date
+    (a partial intraday bar being refreshed) replaces it instead of appending.
+    """
+
+    def __init__(self):
+        self.ma_short = RollingMean(SHORT_WINDOW)
+        self.ma_long = RollingMean(LONG_WINDOW)
+        self.first_date = None
+        self.first_close = None   # detects a history rewritten on a new price scale (split/dividend)
+        self.last_date = None
+        self.latest_bar = {}
+        self._before_last = None   # state before the latest bar, so it can be replaced
+
+    def update(self, date, bar: dict):
+        """Applies one bar ({'Close': ..., 'Open': ..., ...}) for the given date."""
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date < self.last_date:
+            raise ValueError(f"Bar for {date.date()} is older than the latest bar {self.last_date.date()}.")
+        if self.last_date is not None and date == self.last_date:
+            self.ma_short, self.ma_long = (mean.copy() for mean in self._before_last)
+        else:
+            self._before_last = (self.ma_short.copy(), self.ma_long.copy())
+        self.ma_short.push(bar['Close'])
+        self.ma_long.push(bar['Close'])
+        if self.first_date is None:
+            self.first_date = date
+            self.first_close = bar['Close']
+        self.last_date = date
+        self.latest_bar = dict(bar)
+
+    @property
+    def trend_indicator(self) -> float:
+        ma_short, ma_long = self.ma_short.mean, self.ma_long.mean
+        # Avoid division by zero (and NaN windows), as engineer_features does
+        return ma_short / ma_long if ma_long > 0 else 1
+
+    def features(self) -> dict:
+        """The price-based model features, read straight from the state."""
+        features = {field: self.latest_bar.get(field) for field in ['Open', 'High', 'Low', 'Close', 'Volume']}
+        features['trend_indicator'] = self.trend_indicator
+        return features
+
+    @classmethod
+    def rebuild(cls, dates, ohlcv) -> 'TickerFeatureState':
+        """Replays a history of bars: dates of shape (n,), ohlcv of shape (len(FIELDS), n)."""
+        state = cls()
+        for i, date in enumerate(dates):
+            state.update(date, {field: ohlcv[j][i] for j, field in enumerate(FIELDS)})
+        return state
+
+
+class FeatureStateStore:
+    """Per-ticker feature states, kept in step with the local price store."""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def get(self, ticker: str):
+        return self._states.get(ticker.upper())
+
+    @staticmethod
+    def _continues(state: TickerFeatureState, dates, ohlcv) -> bool:
+        """
+        Whether (dates, ohlcv) is the history the state was built from, possibly with newer
+        bars; a re-adjusted history (same dates, rescaled Close) is not.
+        """
+        if state.last_date is None or len(dates) == 0:
+            return False
+        last = np.datetime64(state.last_date, 'D')
+        first = int(np.searchsorted(dates, last))
+        first_close = ohlcv[FIELDS.index('Close')][0]
+        same_scale = first_close == state.first_close or (first_close != first_close and state.first_close != state.first_close)
+        return dates[0] == np.datetime64(state.first_date, 'D') and first < len(dates) and dates[first] == last and same_scale
+
+    def sync(self, ticker: str, dates, ohlcv) -> TickerFeatureState:
+        """
+        Advances a ticker's state with the bars in (dates, ohlcv) it has not seen yet. The
+        first call rebuilds the state from the whole history given, so it matches the
+        pandas rolling means over that same history; later calls only apply new bars
+        (the latest stored bar is re-applied, as it may have been refreshed).
+        """
+        ticker = ticker.upper()
+        with self._lock:
+            state = self._states.get(ticker)
+            if state is None or not self._continues(state, dates, ohlcv):
+                state = self._states[ticker] = TickerFeatureState.rebuild(dates, ohlcv)
+                return state
+            first = int(np.searchsorted(dates, np.datetime64(state.last_date, 'D')))
+            for i in range(first, len(dates)):
+                state.update(dates[i], {field: ohlcv[j][i] for j, field in enumerate(FIELDS)})
+            return state
+
+    def sync_stored(self, ticker: str):
+        """Syncs a ticker against the local price store; None if it has no stored bars."""
+        stored = price_store.read(ticker)
+        if stored is None or len(stored[0]) == 0:
+            return None
+        return self.sync(ticker, *stored)
+
+    def sync_stored_many(self, tickers: list) -> dict:
+        """Returns {ticker: state} for every ticker with stored bars."""
+        states = {ticker.upper(): self.sync_stored(ticker) for ticker in tickers}
+        return {ticker: state for ticker, state in states.items() if state is not None}
+
+
+feature_states = FeatureStateStore()
@@ -1,30 +1,64 @@
 # In: backend/main.py
 
-from fastapi import FastAPI
+import time
+import asyncio
+import threading
+from typing import Literal
+from datetime import datetime
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 import sys
 import pandas as pd
 import os
-import psycopg2
-import json
 from dotenv import load_dotenv
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Add the project root to the Python path
 sys.path.append('..')
-from data_ingestion.yahoo_finance_fetcher import fetch_ticker_data
+from data_ingestion.yahoo_finance_fetcher import load_ticker_data
+from data_ingestion.price_store import price_store
 from data_ingestion.news_fetcher import fetch_news_headlines
-from data_ingestion.fred_fetcher import fetch_macro_data
-from backend.scoring_engine import engineer_features, calculate_credit_score
+from data_ingestion.news_store import news_store
+from data_ingestion.fred_fetcher import fetch_macro_data, macro_cache
+from data_ingestion.rate_limiter import WAIT_TIMEOUTS
+from backend.db import enqueue_score
+from backend.score_history import score_history, drop_alert
+from backend.score_store import history_range, score_maintenance
+from common.sentiment import analyze_articles, sentiment_cache
+from backend.result_cache import score_cache
+from backend.encoding import parse_fields, shape_result, encode_view, json_response
+from backend.feature_state import feature_states
+from backend.model_registry import model_manager
+from backend.scoring_engine import engineer_features, engineer_features_many, calculate_credit_score, score_many, explain_many, warmup, model_status
+from backend.explanations import deferred_explainer
+from backend.pubsub import publish_score
+from backend.stream import score_stream
+from common.metrics import span, start_request, server_timing, render_metrics, request_seconds, slow_request_profiler, CONTENT_TYPE
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hooks: warms the model and in-memory caches without blocking startup."""
+    score_history.resync_in_background()
+    score_stream.start(asyncio.get_running_loop())
+    model_manager.watch_in_background()
+    # Only when SCORE_MAINTENANCE_SECONDS is set; otherwise `python -m backend.score_store maintain` runs from cron
+    score_maintenance.start_in_background()
+    if os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true":
+        threading.Thread(target=warmup, name="model-warmup", daemon=True).start()
+    yield
 
 # Create an instance of the FastAPI application
 app = FastAPI(
     title="Real-Time Explainable Credit Intelligence API",
     description="API for fetching real-time credit data and scores.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- CORS MIDDLEWARE SETUP ---
@@ -42,127 +76,353 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def get_db_connection():
-    """Establishes a robust database connection using individual .env variables."""
-    conn = psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD")
-    )
-    return conn
+# Responses above this size are gzip-compressed for clients that accept it
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """
+    Times every request: the stage spans it ran are echoed in a Server-Timing header and the
+    total goes into the per-route latency histogram. Slow requests can be profiled (see
+    common/metrics.py).
+    """
+    spans = start_request()
+    sampler = slow_request_profiler.start()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    name = f"{request.method} {route.path if route else 'unmatched'}"
+    request_seconds.observe(name, elapsed)
+    response.headers["Server-Timing"] = server_timing(spans, elapsed)
+    slow_request_profiler.finish(sampler, name, elapsed)
+    return response
+
+# records: a list of row dicts per table; columnar: one array per column
+ResponseShape = Literal['records', 'columnar']
+
+# none: score only; sync: SHAP inline; deferred: SHAP on a background pool, fetched via /explanation
+ExplainMode = Literal['none', 'sync', 'deferred']
+
+# raw: every score; hour/day: rollups with min/max/avg/last per bucket; auto: picked from the range length
+HistoryResolution = Literal['auto', 'raw', 'hour', 'day']
+
+# Per-source ingestion timeouts in seconds; a slow source degrades instead of stalling the request.
+# The fetchers stop waiting for a rate-limit token after the same time (see rate_limiter.py).
+SOURCE_TIMEOUTS = {
+    'market': WAIT_TIMEOUTS['yahoo'],
+    'news': WAIT_TIMEOUTS['news'],
+    'macro': WAIT_TIMEOUTS['fred'],
+}
 
 @app.get("/")
 def read_root():
     """Root endpoint for the API. Provides a simple health check."""
     return {"status": "ok", "message": "Credit Intelligence API is running"}
 
+@app.get("/ready")
+def readiness():
+    """Readiness probe: 200 once the model and SHAP explainer are loaded and warmed up, 503 before."""
+    status = model_status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+@app.post("/warmup")
+async def warmup_model():
+    """Loads and warms the model now (no-op if already warm) and reports its status."""
+    return await asyncio.to_thread(warmup)
+
+@app.get("/metrics")
+def metrics():
+    """Stage and request latency histograms in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+@app.get("/model")
+def model_info():
+    """The serving model version and its load status."""
+    return model_status()
+
+@app.post("/model/reload")
+async def reload_model():
+    """
+    Loads the registry's active version now instead of at the next poll. The current
+    version keeps serving until the new one is checked and warm; a rejected version is reported.
+    """
+    return await asyncio.to_thread(model_manager.reload)
+
+async def fetch_source(source: str, func, *args, fallback=None, degraded: list = None, **kwargs):
+    """
+    Runs a blocking fetcher in a worker thread, bounded by the source's timeout.
+    On timeout or error, records the source in `degraded` and returns fallback() instead,
+    so the request can still be scored.
+    """
+    try:
+        with span(f"fetch_{source}"):
+            return await asyncio.wait_for(asyncio.to_thread(func, *args, **kwargs), timeout=SOURCE_TIMEOUTS[source])
+    except asyncio.TimeoutError:
+        print(f"Timed out fetching {source} data after {SOURCE_TIMEOUTS[source]}s, degrading.")
+    except Exception as e:
+        print(f"Failed to fetch {source} data: {e}, degrading.")
+    if degraded is not None:
+        degraded.append(source)
+    return fallback() if fallback else None
+
+async def fetch_all_sources(ticker: str):
+    """Fetches market, news and macro data concurrently. Returns the data and the degraded sources."""
+    degraded = []
+    market_data, news_data, macro_data = await asyncio.gather(
+        fetch_source('market', load_ticker_data, [ticker], period="1y", degraded=degraded,
+                     fallback=lambda: price_store.frame(ticker, period="1y")),
+        fetch_source('news', fetch_news_headlines, query=f"{ticker} company", degraded=degraded, fallback=pd.DataFrame),
+        fetch_source('macro', fetch_macro_data, degraded=degraded, fallback=macro_cache.peek),
+    )
+    return market_data, news_data, macro_data, degraded
+
+def save_score(ticker: str, credit_score_result: dict, features_df: pd.DataFrame, explain: str = 'sync'):
+    """Checks the previous score for a drop alert and saves the new score (blocking DB I/O)."""
+    try:
+        # Alert Logic: Get the most recent score before this one (from the history cache)
+        with span("alert_query"):
+            previous_score = score_history.latest_score(ticker)
+        alert = drop_alert(previous_score, credit_score_result['score'])
+        if alert:
+            credit_score_result['alert'] = alert
+    except Exception as e:
+        print(f"Database error: {e}")
+
+    save_scores([ticker], [credit_score_result], features_df, explain)
+
+def save_scores(ticker_list: list, score_results: list, features_df: pd.DataFrame, explain: str = 'sync'):
+    """
+    Saves a batch of scores. Normally they go through the write-behind queue; with deferred
+    explanations they are inserted right away so each result can carry its score_id.
+    """
+    if explain == 'deferred':
+        try:
+            score_ids = deferred_explainer.submit(ticker_list, score_results, features_df)
+            for result, score_id in zip(score_results, score_ids):
+                result['score_id'] = score_id
+                result['explanation_status'] = 'pending'
+        except Exception as e:
+            print(f"Database error: {e}. Explaining inline instead.")
+            bundle = model_manager.version(score_results[0].get('model_version')) if score_results else None
+            explanations = explain_many(features_df, [result['prediction'] for result in score_results], bundle)
+            for result, explanation in zip(score_results, explanations):
+                result['explanation'] = explanation
+            explain = 'sync'
+
+    # Database Insert Logic: batched by the write-behind queue
+    if explain != 'deferred':
+        with span("db_enqueue"):
+            for ticker, result, features in zip(ticker_list, score_results, features_df.to_dict(orient='records')):
+                enqueue_score(ticker, result['score'], features, result['explanation'], result.get('model_version'))
+    with span("publish"):
+        for ticker, result in zip(ticker_list, score_results):
+            try:
+                previous_score = score_history.latest_score(ticker)
+            except Exception as e:
+                print(f"Database error: {e}")
+                previous_score = None
+            publish_score(ticker, result['score'], previous_score)
+            score_history.record(ticker, result['score'])
+
+def score_ticker(ticker: str, market_data, news_data_json: list, macro_data: dict, explain: str = 'sync'):
+    """Engineers features, scores them and picks the key headline (CPU-bound)."""
+    # 3. Engineer features (price features come from the incremental per-ticker state)
+    with span("feature_state"):
+        feature_state = feature_states.sync_stored(ticker)
+    features_df = engineer_features(ticker, market_data, news_data_json, macro_data, feature_state=feature_state)
+    
+    # 4. Calculate the score using the ML model
+    credit_score_result = calculate_credit_score(features_df, explain=explain)
+    
+    # 5. Find the Key Driving Headline (stored articles carry their sentiment already)
+    key_headline = "No significant news events found."
+    if news_data_json:
+        key_headline = analyze_articles(news_data_json)['key_headline']
+    credit_score_result['key_headline'] = key_headline
+    return credit_score_result, features_df
+
 @app.get("/data/{ticker}")
-async def get_all_data(ticker: str):
-    """Fetches all data, engineers features, calculates a score, checks for alerts, saves it, and returns the result."""
+async def get_all_data(ticker: str, request: Request, explain: ExplainMode = 'sync', fields: str = None,
+                       market_days: int = Query(None, ge=1), shape: ResponseShape = 'records'):
+    """
+    Fetches all data, engineers features, calculates a score, checks for alerts, saves it, and returns the result.
+    explain=none skips SHAP, explain=deferred returns a score_id whose explanation is served by /explanation.
+    Results are cached briefly per ticker (see backend/result_cache.py); X-Cache says how this one was served.
+
+    fields=score,features,market,news,macro picks the sections returned (default: all),
+    market_days keeps only the latest market rows, and shape=columnar returns market data
+    and news as arrays per column. Responses carry an ETag for conditional polling.
+    """
     print(f"Received request for ticker: {ticker}")
+    try:
+        sections = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result, cache_status = await score_cache.get((ticker.upper(), explain), lambda: compute_ticker_data(ticker, explain))
+    # Encoded once per cached result and view; later polls reuse the body and its ETag
+    view = (frozenset(sections), market_days, shape)
+    encoded = encode_view(result, view, lambda: shape_result(result, sections, market_days=market_days, shape=shape))
+    return json_response(request, encoded=encoded, headers={"X-Cache": cache_status.upper()})
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Counters of the /data result cache, the headline sentiment cache, the news store and score maintenance."""
+    return {
+        "results": score_cache.stats(),
+        "sentiment": {"hits": sentiment_cache.hits, "misses": sentiment_cache.misses},
+        "news": news_store.stats(),
+        "score_maintenance": score_maintenance.stats(),
+    }
+
+async def compute_ticker_data(ticker: str, explain: str) -> dict:
+    """Builds a fresh /data result: fetch, score, save."""
+    # 1. Fetch data from all sources concurrently, off the event loop
+    market_data, news_data, macro_data, degraded_sources = await fetch_all_sources(ticker)
     
-    # 1. Fetch data
-    market_data = fetch_ticker_data([ticker], period="1y")
-    news_data = fetch_news_headlines(query=f"{ticker} company")
-    macro_data = fetch_macro_data()
-    
+    if market_data.empty:
+        raise HTTPException(status_code=503, detail=f"No market data available for {ticker}.")
+
     # 2. Pre-process data
     if isinstance(market_data.columns, pd.MultiIndex):
         market_data.columns = ['_'.join(col).strip() for col in market_data.columns.values]
 
-    market_data_json, news_data_json = [], []
+    # Market data is kept column-wise; shape_result builds rows only if they are asked for
+    market_data_columns, news_data_json = {}, []
     if not market_data.empty:
         market_data_df = market_data.reset_index()
         market_data_df['Date'] = market_data_df['Date'].dt.strftime('%Y-%m-%d')
-        market_data_json = market_data_df.to_dict(orient='records')
+        market_data_columns = {name: column.tolist() for name, column in market_data_df.items()}
     if not news_data.empty:
         news_df_temp = news_data.copy()
         news_df_temp['publishedAt'] = pd.to_datetime(news_df_temp['publishedAt']).dt.strftime('%Y-%m-%d %H:%M:%S')
         news_data_json = news_df_temp.to_dict(orient='records')
         
-    # 3. Engineer features
-    features_df = engineer_features(ticker, market_data_json, news_data_json, macro_data)
-    
-    # 4. Calculate the score using the ML model
-    credit_score_result = calculate_credit_score(features_df)
-    
-    # 5. Find the Key Driving Headline
-    key_headline = "No significant news events found."
-    if news_data_json:
-        analyzer = SentimentIntensityAnalyzer()
-        max_sentiment_score = -1
-        for article in news_data_json:
-            sentiment = analyzer.polarity_scores(article['title'])['compound']
-            if abs(sentiment) > max_sentiment_score:
-                max_sentiment_score = abs(sentiment)
-                key_headline = article['title']
-    credit_score_result['key_headline'] = key_headline
+    # 3-5. Engineer features, score and pick the key headline
+    credit_score_result, features_df = await asyncio.to_thread(score_ticker, ticker, market_data_columns, news_data_json, macro_data, explain)
+    features = features_df.to_dict(orient='records')[0]
     
     # 6. Save to DB, check for alerts
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Alert Logic: Get the most recent score before this one
-        query = "SELECT score FROM credit_scores WHERE ticker = %s ORDER BY created_at DESC LIMIT 1"
-        cur.execute(query, (ticker.upper(),))
-        previous_score = cur.fetchone()
-        
-        if previous_score and credit_score_result['score'] < previous_score[0] - 10: # Drop of >10 points
-            credit_score_result['alert'] = f"Significant Score Drop from {previous_score[0]}"
-
-        # Database Insert Logic
-        insert_query = "INSERT INTO credit_scores (ticker, score, features, explanation) VALUES (%s, %s, %s, %s)"
-        score_data = (
-            ticker.upper(),
-            credit_score_result['score'],
-            json.dumps(features_df.to_dict(orient='records')[0]),
-            json.dumps(credit_score_result['explanation'])
-        )
-        cur.execute(insert_query, score_data)
-        conn.commit()
-        
-        cur.close()
-        conn.close()
-        print(f"Successfully saved score for {ticker} to the database.")
-    except Exception as e:
-        print(f"Database error: {e}")
+    await asyncio.to_thread(save_score, ticker, credit_score_result, features_df, explain)
 
     # 7. Return the final response
     return {
         "ticker": ticker,
         "credit_score": credit_score_result,
-        "features": features_df.to_dict(orient='records')[0],
+        "features": features,
+        "degraded_sources": degraded_sources,
         "raw_data": {
-            "market_data": market_data_json,
+            "market_data": market_data_columns,
             "news": news_data_json,
             "macro_data": macro_data
         }
     }
 
+class BatchScoreRequest(BaseModel):
+    tickers: list[str]
+    explain: ExplainMode = 'sync'
+
+@app.post("/score/batch")
+async def score_batch(request: BatchScoreRequest):
+    """Scores a watchlist of tickers with one market download, one predict and one SHAP pass."""
+    ticker_list = list(dict.fromkeys(ticker.strip().upper() for ticker in request.tickers if ticker.strip()))
+    print(f"Received batch request for {len(ticker_list)} tickers.")
+    if not ticker_list:
+        return {"results": {}}
+
+    # 1. Fetch data concurrently: one multi-symbol download, macro data once for the whole batch
+    market_data, macro_data, *news_frames = await asyncio.gather(
+        fetch_source('market', load_ticker_data, ticker_list, period="1y", fallback=pd.DataFrame),
+        fetch_source('macro', fetch_macro_data, fallback=macro_cache.peek),
+        *[fetch_source('news', fetch_news_headlines, query=f"{ticker} company", fallback=pd.DataFrame) for ticker in ticker_list],
+    )
+    news_data = {
+        ticker: news.to_dict(orient='records') if not news.empty else []
+        for ticker, news in zip(ticker_list, news_frames)
+    }
+
+    if isinstance(market_data.columns, pd.MultiIndex):
+        market_data.columns = ['_'.join(col).strip() for col in market_data.columns.values]
+
+    # 2. Engineer features and score the whole matrix at once
+    states = await asyncio.to_thread(feature_states.sync_stored_many, ticker_list)
+    features_df = await asyncio.to_thread(engineer_features_many, ticker_list, market_data, news_data, macro_data, states)
+    score_results = await asyncio.to_thread(score_many, features_df, request.explain)
+    features_records = features_df.to_dict(orient='records')
+
+    # 3. Save all scores
+    await asyncio.to_thread(save_scores, ticker_list, score_results, features_df, request.explain)
+
+    return {
+        "results": {
+            ticker: {"credit_score": result, "features": features}
+            for ticker, result, features in zip(ticker_list, score_results, features_records)
+        }
+    }
+
+@app.get("/explanation/{score_id}")
+async def get_explanation(score_id: int):
+    """Returns the SHAP explanation of a score produced with explain=deferred, or its pending status."""
+    try:
+        status = await deferred_explainer.status_async(score_id)
+    except Exception as e:
+        print(f"Database explanation error: {e}")
+        raise HTTPException(status_code=503, detail="Explanation store unavailable.")
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"No score with id {score_id}.")
+    return {"score_id": score_id, **status}
+
+@app.get("/stream/scores")
+async def stream_scores(tickers: str = None):
+    """
+    Server-Sent Events stream of new scores. Subscribe to comma-separated tickers (or all
+    when omitted); the stream opens with a snapshot of the latest scores, then sends
+    'score' events (with the delta from the previous score) and 'alert' events as the API
+    or live_worker produce them.
+    """
+    ticker_set = {ticker.strip().upper() for ticker in tickers.split(',') if ticker.strip()} if tickers else None
+
+    def latest_scores():
+        try:
+            return {ticker: score_history.latest_score(ticker) for ticker in ticker_set or []}
+        except Exception as e:
+            print(f"Database history error: {e}")
+            return {}
+
+    snapshot = await asyncio.to_thread(latest_scores)
+    return StreamingResponse(
+        score_stream.events(ticker_set, snapshot=snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/history/{tickers}")
-async def get_score_history(tickers: str):
-    """Fetches historical scores for one or more comma-separated tickers."""
+async def get_score_history(tickers: str, start: datetime = Query(None, alias="from"),
+                            end: datetime = Query(None, alias="to"), resolution: HistoryResolution = None):
+    """
+    Fetches historical scores for one or more comma-separated tickers. Without parameters
+    it returns the latest 30 scores per ticker. from/to (ISO dates or datetimes, UTC by
+    default) select a range, read from raw scores or the hourly/daily rollups according to
+    resolution (auto picks by range length); X-History-Resolution says which was used.
+    """
     ticker_list = [ticker.strip().upper() for ticker in tickers.split(',')]
-    history = {}
+    if start is None and end is None and resolution is None:
+        history = {}
+        try:
+            history = await asyncio.to_thread(score_history.history, ticker_list)
+            print(f"Successfully fetched historical records for {ticker_list}.")
+        except Exception as e:
+            print(f"Database history error: {e}")
+        return history
+
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        for ticker in ticker_list:
-            history[ticker] = []
-            select_query = "SELECT created_at, score FROM credit_scores WHERE ticker = %s ORDER BY created_at DESC LIMIT 30"
-            cur.execute(select_query, (ticker,))
-            
-            records = cur.fetchall()
-            ticker_history = [{"date": row[0].strftime('%Y-%m-%d %H:%M'), "score": row[1]} for row in records]
-            history[ticker] = sorted(ticker_history, key=lambda x: x['date'])
-
-        cur.close()
-        conn.close()
-        print(f"Successfully fetched historical records for {ticker_list}.")
+        used, history = await asyncio.to_thread(history_range, ticker_list, start, end, resolution or 'auto')
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Database history error: {e}")
-
-    return history
\ No newline at end of file
+        used, history = resolution or 'auto', {ticker: [] for ticker in ticker_list}
+    print(f"Successfully fetched {used} history for {ticker_list}.")
+    return JSONResponse(content=history, headers={"X-History-Resolution": used})
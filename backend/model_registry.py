@@ -0,0 +1,334 @@
+# In: backend/model_registry.py
+#
+# Versioned model registry with zero-downtime hot-swap. Layout:
+#
+#   models/
+#     CURRENT              <- name of the active version
+#     v2025-01-15/
+#       model.pkl
+#       model.pkl.compiled/   (written on first load)
+#
+# Publish a model trained in notebooks/03 with:
+#   python -m backend.model_registry publish credit_model.pkl --activate
+
+import os
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import joblib
+from backend.tree_engine import CompiledEnsemble, compile_model
+
+REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH", "models")
+CURRENT_FILE = "CURRENT"
+MODEL_FILE = "model.pkl"
+
+# Used when the registry has no active version yet
+MODEL_PATH = os.getenv("MODEL_PATH", "credit_model.pkl")
+
+# How often the API checks the registry for a newly activated version
+POLL_SECONDS = float(os.getenv("MODEL_POLL_SECONDS", 30))
+
+# Rows the compiled predictor is checked against before a version goes live
+PARITY_SAMPLE_PATH = os.getenv("MODEL_PARITY_SAMPLE", "training_dataset.csv")
+PARITY_ROWS = 1000
+PARITY_TOLERANCE = 1e-9
+
+# The compiled walk wins for a handful of rows (live requests); past this many rows the
+# estimator's own predict is faster (backtests, large batches)
+COMPILED_MAX_ROWS = int(os.getenv("COMPILED_MAX_ROWS", 500))
+
+
+def current_version(registry: str = REGISTRY_PATH):
+    """Returns the active version name, or None if the registry has none."""
+    try:
+        with open(os.path.join(registry, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve(registry: str = REGISTRY_PATH) -> tuple:
+    """Returns (version, pickle path) of the model that should be serving."""
+    version = current_version(registry)
+    if version is not None:
+        return version, os.path.join(registry, version, MODEL_FILE)
+    # No registry: serve the standalone pickle, versioned by its content
+    with open(MODEL_PATH, 'rb') as f:
+        digest = hashlib.file_digest(f, 'blake2b').hexdigest()[:12]
+    return f"{os.path.basename(MODEL_PATH)}@{digest}", MODEL_PATH
+
+
+def activate(version: str, registry: str = REGISTRY_PATH):
+    """Points CURRENT at a published version (atomically, so readers never see a partial name)."""
+    if not os.path.isfile(os.path.join(registry, version, MODEL_FILE)):
+        raise FileNotFoundError(f"Version '{version}' is not in the registry at '{registry}'.")
+    tmp_path = os.path.join(registry, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(registry, CURRENT_FILE))
+
+
+def publish(model_path: str, version: str = None, registry: str = REGISTRY_PATH, make_active: bool = False) -> str:
+    """Copies a trained model into the registry as a new version and returns its name."""
+    version = version or datetime.now().strftime('v%Y%m%d-%H%M%S')
+    target = os.path.join(registry, version)
+    if os.path.exists(target):
+        raise FileExistsError(f"Version '{version}' already exists.")
+    os.makedirs(target)
+    shutil.copy2(model_path, os.path.join(target, MODEL_FILE))
+    if make_active:
+        activate(version, registry)
+    return version
+
+
+def parity_sample(features: list) -> pd.DataFrame:
+    """Reference rows for the parity check: the training data if present, else synthetic rows."""
+    try:
+        df = pd.read_csv(PARITY_SAMPLE_PATH, nrows=PARITY_ROWS)
+        sample = df.reindex(columns=features)
+        return sample.fillna(sample.mean()).fillna(0)
+    except Exception:
+        rng = np.random.default_rng(0)
+        return pd.DataFrame(rng.normal(size=(200, len(features))), columns=features)
+
+
+class ModelVersion:
+    """
+    One loaded model version: its compiled predictor, plus the estimator and SHAP explainer,
+    both loaded on first use. Small batches are served by the compiled predictor alone, so
+    the pickle is only read for explanations, large batches or a missing compiled copy.
+    """
+
+    def __init__(self, version: str, path: str):
+        self.version = version
+        self.path = path
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.compiled = self._load_compiled(f"{path}.compiled")
+        names = self.compiled.feature_names if self.compiled is not None else self.model.feature_names_in_
+        self.features = [str(name) for name in names]
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The estimator from the pickle, loaded on first use."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = joblib.load(self.path, mmap_mode='r')
+                    print(f"✅ Estimator loaded for model {self.version}.")
+        return self._model
+
+    def _load_compiled(self, compiled_path: str):
+        """Uses the compiled copy when it is at least as new as the pickle, compiling it otherwise."""
+        try:
+            fresh = os.path.isdir(compiled_path) and os.path.getmtime(compiled_path) >= os.path.getmtime(self.path)
+            if not fresh:
+                compile_model(self.model).save(compiled_path)
+            return CompiledEnsemble.load(compiled_path, mmap_mode='r')
+        except Exception as e:
+            print(f"Model compilation skipped for {self.version}: {e}. Using model.predict.")
+            return None
+
+    @property
+    def explainer_loaded(self) -> bool:
+        return self._explainer is not None
+
+    def explainer(self):
+        """Builds the SHAP explainer on first use; importing shap alone takes seconds."""
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    import shap
+                    self._explainer = shap.TreeExplainer(self.model)
+                    print(f"✅ SHAP explainer loaded for model {self.version}.")
+        return self._explainer
+
+    def predict(self, features_df: pd.DataFrame) -> np.ndarray:
+        """Raw predictions, via the compiled ensemble when available and the batch is small."""
+        if self.compiled is not None and len(features_df) <= COMPILED_MAX_ROWS:
+            return self.compiled.predict(features_df.to_numpy(dtype='float64'))
+        return self.model.predict(features_df)
+
+    def check_parity(self) -> float:
+        """Largest difference between the compiled and the original predictions on reference rows."""
+        sample = parity_sample(self.features)
+        predictions = self.model.predict(sample)
+        if not np.all(np.isfinite(predictions)):
+            raise ValueError("Model produced non-finite predictions on the reference rows.")
+        if self.compiled is None:
+            return 0.0
+        return float(np.max(np.abs(self.compiled.predict(sample.to_numpy(dtype='float64')) - predictions)))
+
+    def warmup(self):
+        """Runs one prediction and one explanation end to end, so the first request is not slow."""
+        row = pd.DataFrame([np.zeros(len(self.features))], columns=self.features)
+        self.predict(row)
+        self.explainer().shap_values(row)
+
+
+class ModelManager:
+    """
+    Holds the serving model version. Requests take a reference to the active version once
+    and use it throughout, so a swap never changes the model under an in-flight request.
+    A new version replaces the active one only after it has been loaded, compiled,
+    parity-checked and warmed up.
+    """
+
+    def __init__(self, registry: str = REGISTRY_PATH):
+        self.registry = registry
+        self._active = None
+        self._retired = {}          # recently replaced versions, for deferred explanations
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()   # one candidate is loaded at a time
+        self._load_failed = False
+        self._watching = False
+        self._swap_callbacks = []
+        self._status = {"version": None, "model_loaded": False, "explainer_loaded": False, "ready": False,
+                        "load_seconds": None, "swaps": 0, "error": None}
+
+    def on_swap(self, callback):
+        """Registers callback(old_version, new_version), called after each swap."""
+        self._swap_callbacks.append(callback)
+
+    def get(self):
+        """Returns the active ModelVersion, loading it on first use; None if no model is available."""
+        if self._active is not None or self._load_failed:
+            return self._active
+        with self._lock:
+            if self._active is None and not self._load_failed:
+                start = time.perf_counter()
+                try:
+                    self._active = ModelVersion(*resolve(self.registry))
+                except Exception as e:
+                    self._load_failed = True
+                    self._status["error"] = str(e)
+                    print(f"❌ Model loading failed: {e}. Scoring will be disabled.")
+                    return None
+                self._status.update(version=self._active.version, model_loaded=True,
+                                    load_seconds=round(time.perf_counter() - start, 3))
+                print(f"✅ Model {self._active.version} loaded in {self._status['load_seconds']}s.")
+                print(f"Model expects features: {self._active.features}")
+        return self._active
+
+    def version(self, name: str):
+        """Returns the active version if it is `name`, a recently retired one, or None."""
+        active = self._active
+        if active is not None and active.version == name:
+            return active
+        return self._retired.get(name)
+
+    def warmup(self) -> dict:
+        active = self.get()
+        if active is not None and not self._status["ready"]:
+            try:
+                active.warmup()
+                self._status.update(explainer_loaded=True, ready=True)
+            except Exception as e:
+                self._status["error"] = str(e)
+                print(f"❌ Warmup failed: {e}")
+        return self.status()
+
+    def reload(self) -> dict:
+        """
+        Loads the registry's current version if it differs from the active one, checks and
+        warms it up, then swaps it in. On any failure the active version keeps serving.
+        """
+        with self._reload_lock:
+            return self._reload()
+
+    def _reload(self) -> dict:
+        try:
+            version, path = resolve(self.registry)
+        except Exception as e:
+            return {**self.status(), "reloaded": False, "error": str(e)}
+        active = self.get()
+        if active is not None and active.version == version:
+            return {**self.status(), "reloaded": False}
+
+        print(f"Loading model {version} for hot-swap...")
+        start = time.perf_counter()
+        try:
+            candidate = ModelVersion(version, path)
+            difference = candidate.check_parity()
+            if difference > PARITY_TOLERANCE:
+                raise ValueError(f"compiled predictions differ from the model by {difference:.3e}")
+            candidate.warmup()
+        except Exception as e:
+            print(f"❌ Model {version} rejected: {e}. Keeping {active.version if active else 'no model'}.")
+            return {**self.status(), "reloaded": False, "error": f"Model {version} rejected: {e}"}
+
+        with self._lock:
+            previous, self._active = self._active, candidate
+            self._load_failed = False
+            if previous is not None:
+                self._retired = {previous.version: previous}
+            self._status.update(version=version, model_loaded=True, explainer_loaded=True, ready=True,
+                                load_seconds=round(time.perf_counter() - start, 3), error=None)
+            self._status["swaps"] += 1
+        for callback in self._swap_callbacks:
+            callback(previous.version if previous else None, version)
+        print(f"✅ Swapped to model {version} in {self._status['load_seconds']}s.")
+        return {**self.status(), "reloaded": True}
+
+    def watch_in_background(self, poll_seconds: float = POLL_SECONDS):
+        """Polls the registry and hot-swaps newly activated versions."""
+        if self._watching:
+            return
+        self._watching = True
+
+        def run():
+            rejected = None   # not retried until CURRENT changes again or /model/reload is called
+            while True:
+                time.sleep(poll_seconds)
+                version = current_version(self.registry)
+                if version not in (None, rejected, self._status["version"]):
+                    if not self.reload().get("reloaded") and self._status["version"] != version:
+                        rejected = version
+
+        threading.Thread(target=run, name="model-watcher", daemon=True).start()
+
+    def status(self) -> dict:
+        status = dict(self._status)
+        if self._active is not None:
+            status["explainer_loaded"] = self._active.explainer_loaded
+        return status
+
+
+model_manager = ModelManager()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the model registry.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish_cmd = commands.add_parser("publish", help="Add a trained model as a new version.")
+    publish_cmd.add_argument("model_path")
+    publish_cmd.add_argument("--version")
+    publish_cmd.add_argument("--activate", action="store_true", help="Make it the serving version.")
+    activate_cmd = commands.add_parser("activate", help="Make a published version the serving one.")
+    activate_cmd.add_argument("version")
+    commands.add_parser("list", help="List published versions.")
+    args = parser.parse_args(argv)
+
+    if args.command == "publish":
+        version = publish(args.model_path, args.version, make_active=args.activate)
+        print(f"✅ Published {version}{' (active)' if args.activate else ''}.")
+    elif args.command == "activate":
+        activate(args.version)
+        print(f"✅ {args.version} is now active; API processes pick it up within {POLL_SECONDS:.0f}s.")
+    else:
+        active = current_version()
+        versions = sorted(name for name in os.listdir(REGISTRY_PATH) if os.path.isdir(os.path.join(REGISTRY_PATH, name))) \
+            if os.path.isdir(REGISTRY_PATH) else []
+        for name in versions:
+            print(f"{'*' if name == active else ' '} {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# In: backend/pubsub.py
+
+import os
+import json
+import time
+import select
+import threading
+from datetime import datetime, timezone
+from backend.db import run_query, connect_dedicated
+from backend.score_history import drop_alert
+
+# 'memory' delivers within this process only; 'postgres' uses LISTEN/NOTIFY, so scores
+# published by live_worker reach every API process. Defaults to 'postgres' when a
+# database is configured.
+BUS_BACKEND = os.getenv("SCORE_BUS", "postgres" if os.getenv("DB_HOST") else "memory").lower()
+CHANNEL = os.getenv("SCORE_BUS_CHANNEL", "score_events")
+
+# Seconds between reconnect attempts when the LISTEN connection drops
+RECONNECT_SECONDS = 5
+
+
+class InProcessBus:
+    """Publishes events straight to the subscribers registered in this process."""
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Registers callback(event: dict); it may be called from any thread."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _deliver(self, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Score event subscriber failed: {e}")
+
+    def publish(self, event: dict):
+        self._deliver(event)
+
+
+def _notify(cur, channel: str, payload: str):
+    cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+
+class PostgresBus(InProcessBus):
+    """
+    Publishes with NOTIFY and delivers what a dedicated LISTEN connection receives, so
+    every process subscribed to the channel (including the publisher) sees each event once.
+    """
+
+    def __init__(self, channel: str = CHANNEL):
+        super().__init__()
+        self.channel = channel
+        self._listener = None
+
+    def subscribe(self, callback):
+        super().subscribe(callback)
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="score-bus-listener", daemon=True)
+                self._listener.start()
+
+    def publish(self, event: dict):
+        # NOTIFY payloads are limited to 8000 bytes, so events carry no explanations
+        run_query(_notify, self.channel, json.dumps(event))
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = connect_dedicated()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+                print(f"✅ Listening for score events on '{self.channel}'.")
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._deliver(json.loads(notify.payload))
+            except Exception as e:
+                print(f"❌ Score event listener error: {e}. Reconnecting in {RECONNECT_SECONDS}s.")
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(RECONNECT_SECONDS)
+
+
+if BUS_BACKEND == 'postgres':
+    score_bus = PostgresBus()
+else:
+    score_bus = InProcessBus()
+    if os.getenv("DB_HOST"):
+        print("⚠️ SCORE_BUS=memory: scores from live_worker will not reach /stream/scores in other processes.")
+
+
+def publish_score(ticker: str, score: int, previous_score=None, source: str = "api"):
+    """
+    Publishes a 'score' event (with the delta from the previous score) and, for a
+    significant drop, an 'alert' event. Publishing never fails the caller.
+    """
+    created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    event = {
+        "type": "score",
+        "ticker": ticker.upper(),
+        "score": score,
+        "previous_score": previous_score,
+        "delta": None if previous_score is None else score - previous_score,
+        "source": source,
+        "created_at": created_at,
+    }
+    events = [event]
+    alert = drop_alert(previous_score, score)
+    if alert:
+        events.append({**event, "type": "alert", "message": alert})
+    for event in events:
+        try:
+            score_bus.publish(event)
+        except Exception as e:
+            print(f"Could not publish {event['type']} event for {ticker}: {e}")
@@ -0,0 +1,99 @@
+# In: backend/result_cache.py
+
+import os
+import time
+import asyncio
+
+# A cached /data result is served as-is for FRESH_SECONDS; until STALE_SECONDS it is still
+# served instantly, but a background refresh is started
+FRESH_SECONDS = float(os.getenv("RESULT_CACHE_TTL", 30))
+STALE_SECONDS = float(os.getenv("RESULT_CACHE_STALE_SECONDS", 300))
+MAX_ENTRIES = int(os.getenv("RESULT_CACHE_SIZE", 5000))
+
+
+class ScoreResultCache:
+    """
+    Short-TTL cache of scored /data results with stale-while-revalidate. Concurrent
+    requests for the same key share one in-flight computation, so a burst of requests
+    for a ticker produces one score (and one credit_scores row) instead of one each.
+    Lives on the event loop: compute functions are coroutines.
+    """
+
+    def __init__(self, fresh_seconds: float = FRESH_SECONDS, stale_seconds: float = STALE_SECONDS,
+                 max_entries: int = MAX_ENTRIES):
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._entries = {}     # key -> (computed_at, value)
+        self._in_flight = {}   # key -> asyncio.Task
+        self.hits = self.stale_hits = self.misses = self.coalesced = 0
+        self.refreshes = self.errors = 0
+
+    def _start(self, key, compute) -> asyncio.Task:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.create_task(self._run(key, compute))
+        return task
+
+    async def _run(self, key, compute):
+        try:
+            value = await compute()
+            self._entries[key] = (time.monotonic(), value)
+            if len(self._entries) > self.max_entries:
+                # Drop the oldest result
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+            return value
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def get(self, key, compute) -> tuple:
+        """
+        Returns (value, status) where status is 'hit', 'stale', 'coalesced' or 'miss'.
+        Errors from compute propagate to every caller waiting on it and are not cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.fresh_seconds:
+                self.hits += 1
+                return entry[1], 'hit'
+            if age < self.stale_seconds:
+                self.stale_hits += 1
+                if key not in self._in_flight:
+                    self.refreshes += 1
+                    self._start(key, compute).add_done_callback(self._log_refresh_error)
+                return entry[1], 'stale'
+
+        if key in self._in_flight:
+            self.coalesced += 1
+            status = 'coalesced'
+        else:
+            self.misses += 1
+            status = 'miss'
+        # Shielded so a cancelled client request does not cancel the shared computation
+        return await asyncio.shield(self._start(key, compute)), status
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Background refresh failed, keeping the stale result: {task.exception()}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "hit_rate": round((self.hits + self.stale_hits + self.coalesced) / lookups, 4) if lookups else None,
+        }
+
+
+score_cache = ScoreResultCache()
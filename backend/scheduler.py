@@ -0,0 +1,214 @@
+# In: backend/scheduler.py
+
+import os
+import time
+import heapq
+import random
+import threading
+from datetime import timezone
+from data_ingestion.rate_limiter import limiter_stats
+from backend.db import run_query
+
+# Tickers refreshed when no universe is configured and the database has none yet
+DEFAULT_TICKERS = ['AAPL', 'MSFT', 'GOOGL', 'TSLA', 'NVDA']
+
+# A priority-1 ticker is rescored this often; priority p every REFRESH_SECONDS / p
+REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", 900))
+WORKERS = int(os.getenv("LIVE_WORKERS", 8))
+
+# Failed refreshes are retried after RETRY_BASE_SECONDS * 2^attempt (capped, with jitter)
+MAX_RETRIES = int(os.getenv("LIVE_MAX_RETRIES", 4))
+RETRY_BASE_SECONDS = float(os.getenv("LIVE_RETRY_BASE_SECONDS", 30))
+RETRY_MAX_SECONDS = 15 * 60
+
+# The database-derived universe is re-read at most this often
+UNIVERSE_RELOAD_SECONDS = float(os.getenv("LIVE_UNIVERSE_RELOAD_SECONDS", 900))
+
+_universe_cache = {"loaded_at": 0.0, "tickers": None}
+
+
+def _fetch_universe(cur) -> list:
+    cur.execute("SELECT ticker, MAX(created_at) FROM credit_scores GROUP BY ticker")
+    return cur.fetchall()
+
+
+def _fetch_tickers(cur) -> list:
+    # Skip scan: one index probe per distinct ticker on (ticker, created_at), not a full GROUP BY
+    cur.execute("""
+        WITH RECURSIVE tickers AS (
+            SELECT MIN(ticker) AS ticker FROM credit_scores
+            UNION ALL
+            SELECT (SELECT MIN(ticker) FROM credit_scores WHERE ticker > tickers.ticker)
+            FROM tickers WHERE tickers.ticker IS NOT NULL
+        )
+        SELECT ticker FROM tickers WHERE ticker IS NOT NULL
+    """)
+    return [row[0] for row in cur.fetchall()]
+
+
+def load_universe() -> dict:
+    """
+    Returns {ticker: priority} for the live universe. TICKER_UNIVERSE is a comma-separated
+    list of TICKER or TICKER:priority; without it, every ticker already in credit_scores
+    is refreshed at priority 1 (re-read from the database every UNIVERSE_RELOAD_SECONDS).
+    """
+    configured = os.getenv("TICKER_UNIVERSE")
+    if configured:
+        universe = {}
+        for entry in configured.split(','):
+            ticker, _, priority = entry.strip().partition(':')
+            if ticker:
+                universe[ticker.upper()] = float(priority) if priority else 1.0
+        return universe
+    tickers = _universe_cache["tickers"]
+    if tickers is None or time.time() - _universe_cache["loaded_at"] >= UNIVERSE_RELOAD_SECONDS:
+        try:
+            tickers = run_query(_fetch_tickers)
+            _universe_cache.update(loaded_at=time.time(), tickers=tickers)
+        except Exception as e:
+            print(f"Could not load the ticker universe from the database: {e}")
+            tickers = tickers or []
+    return {ticker: 1.0 for ticker in tickers} or {ticker: 1.0 for ticker in DEFAULT_TICKERS}
+
+
+def last_scored_times() -> dict:
+    """Returns {ticker: unix time of its latest score}, used to schedule the stalest first."""
+    try:
+        rows = run_query(_fetch_universe)
+    except Exception as e:
+        print(f"Could not load last score times: {e}. Treating every ticker as stale.")
+        return {}
+    # Naive timestamps are stored in UTC
+    return {
+        ticker: (created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)).timestamp()
+        for ticker, created_at in rows
+    }
+
+
+class RefreshScheduler:
+    """
+    Keeps every ticker in the universe scored. Tickers sit in a heap ordered by when they
+    are next due (their last refresh plus an interval that shrinks with priority), so the
+    stalest, most important names go first. A pool of workers pulls due tickers; upstream
+    quotas are enforced by the token buckets in data_ingestion/rate_limiter.py, so the
+    refresh rate is bounded by those rather than by fixed sleeps.
+    """
+
+    def __init__(self, job, universe: dict, workers: int = WORKERS, refresh_seconds: float = REFRESH_SECONDS,
+                 last_refreshed: dict = None):
+        self.job = job                  # callable(ticker) -> bool, True on success
+        self.workers = workers
+        self.refresh_seconds = refresh_seconds
+        self._heap = []                 # (due time, -priority, ticker)
+        self._priority = {}
+        self._attempts = {}             # ticker -> consecutive failures
+        self._last_refreshed = dict(last_refreshed or {})
+        self._in_flight = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._threads = []
+        self.completed = self.failed = self.retried = 0
+        self.set_universe(universe)
+
+    def _interval(self, ticker: str) -> float:
+        return self.refresh_seconds / max(self._priority.get(ticker, 1.0), 1e-6)
+
+    def set_universe(self, universe: dict):
+        """Replaces the universe; new tickers are due at once if they have never been scored."""
+        with self._cond:
+            self._priority = {ticker.upper(): priority for ticker, priority in universe.items()}
+            scheduled = {ticker for _, _, ticker in self._heap} | self._in_flight
+            for ticker, priority in self._priority.items():
+                if ticker not in scheduled:
+                    due = self._last_refreshed.get(ticker, 0) + self._interval(ticker)
+                    heapq.heappush(self._heap, (due, -priority, ticker))
+            # Tickers dropped from the universe are skipped when popped
+            self._cond.notify_all()
+
+    def _next_ticker(self):
+        with self._cond:
+            while not self._stopped:
+                if self._heap:
+                    due, _, ticker = self._heap[0]
+                    if ticker not in self._priority:
+                        heapq.heappop(self._heap)
+                        continue
+                    wait = due - time.time()
+                    if wait <= 0:
+                        heapq.heappop(self._heap)
+                        self._in_flight.add(ticker)
+                        return ticker
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _finish(self, ticker: str, success: bool):
+        now = time.time()
+        with self._cond:
+            self._in_flight.discard(ticker)
+            if success:
+                self.completed += 1
+                self._attempts.pop(ticker, None)
+                self._last_refreshed[ticker] = now
+                due = now + self._interval(ticker)
+            else:
+                self.failed += 1
+                attempt = self._attempts.get(ticker, 0)
+                if attempt < MAX_RETRIES:
+                    self.retried += 1
+                    self._attempts[ticker] = attempt + 1
+                    backoff = min(RETRY_BASE_SECONDS * 2 ** attempt, RETRY_MAX_SECONDS)
+                    due = now + backoff * random.uniform(0.8, 1.2)
+                else:
+                    # Out of retries: wait for the next regular refresh
+                    self._attempts.pop(ticker, None)
+                    due = now + self._interval(ticker)
+            if ticker in self._priority:
+                heapq.heappush(self._heap, (due, -self._priority[ticker], ticker))
+            self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            ticker = self._next_ticker()
+            if ticker is None:
+                return
+            try:
+                success = bool(self.job(ticker))
+            except Exception as e:
+                print(f"❌ Refresh of {ticker} raised: {e}")
+                success = False
+            self._finish(ticker, success)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"refresh-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self) -> dict:
+        """Queue depth and throughput counters, plus the state of each upstream rate limit."""
+        now = time.time()
+        with self._cond:
+            queued = [(due, ticker) for due, _, ticker in self._heap if ticker in self._priority]
+            refreshed = [self._last_refreshed[ticker] for ticker in self._priority if ticker in self._last_refreshed]
+            return {
+                "universe": len(self._priority),
+                "queued": len(queued),
+                "due": sum(1 for due, _ in queued if due <= now),
+                "in_flight": len(self._in_flight),
+                "retrying": len(self._attempts),
+                "completed": self.completed,
+                "failed": self.failed,
+                "retried": self.retried,
+                "never_refreshed": len(self._priority) - len(refreshed),
+                "max_staleness_seconds": round(now - min(refreshed), 1) if refreshed else None,
+                "rate_limits": limiter_stats(),
+            }
@@ -0,0 +1,181 @@
+# In: backend/score_history.py
+
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from backend.db import run_query
+
+# Number of recent scores kept per ticker (matches what /history returns)
+HISTORY_LENGTH = 30
+
+# Other processes (e.g. live_worker) also write scores, so rows inserted since the last
+# sync are read from the database in the background once the cache is this old
+RESYNC_SECONDS = float(os.getenv("SCORE_HISTORY_RESYNC_SECONDS", 60))
+
+# Each incremental sync re-reads this many ids below the newest one seen, so rows whose
+# transaction committed after a higher id was already visible are not skipped
+RESYNC_ID_OVERLAP = 1000
+
+# A score this many points below the previous one raises a drop alert
+ALERT_DROP_POINTS = 10
+
+
+def drop_alert(previous_score, score):
+    """Returns the alert message for a significant score drop, or None."""
+    if previous_score is not None and score < previous_score - ALERT_DROP_POINTS:
+        return f"Significant Score Drop from {previous_score}"
+    return None
+
+
+def _as_utc(created_at: datetime) -> datetime:
+    """Normalises timestamps to naive UTC so DB rows and local inserts sort together."""
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at
+
+
+def _fetch_all_recent(cur, length: int) -> list:
+    cur.execute("""
+        SELECT id, ticker, created_at, score FROM (
+            SELECT id, ticker, created_at, score,
+                   ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY created_at DESC) AS rn
+            FROM credit_scores
+        ) ranked
+        WHERE rn <= %s
+        ORDER BY ticker, created_at
+    """, (length,))
+    return cur.fetchall()
+
+
+def _fetch_since(cur, last_id: int) -> list:
+    cur.execute("SELECT id, ticker, created_at, score FROM credit_scores WHERE id > %s ORDER BY id", (last_id,))
+    return cur.fetchall()
+
+
+def _fetch_recent(cur, ticker: str, length: int) -> list:
+    cur.execute(
+        "SELECT id, created_at, score FROM credit_scores WHERE ticker = %s ORDER BY created_at DESC LIMIT %s",
+        (ticker, length)
+    )
+    return cur.fetchall()[::-1]
+
+
+class ScoreHistoryCache:
+    """
+    In-process ring buffer of the most recent scores per ticker. Warmed with a single
+    windowed query, updated on every insert, kept in step with other writers by reading
+    only the rows inserted since the last sync, and only falls back to the database for
+    tickers it has never seen.
+    """
+
+    def __init__(self, length: int = HISTORY_LENGTH, resync_seconds: float = RESYNC_SECONDS):
+        self.length = length
+        self.resync_seconds = resync_seconds
+        self._history = {}   # ticker -> deque of (created_at, score, score_id or None if local), oldest first
+        self._lock = threading.Lock()
+        self._warmed = False
+        self._last_id = 0    # newest credit_scores id seen
+        self._sync_started_at = 0
+        self._syncing = False
+
+    def _merge(self, ticker: str, rows: list):
+        """Adds (id, created_at, score) rows to a ticker's entries. Caller holds the lock."""
+        entries = self._history.get(ticker) or ()
+        synced = {entry[2]: entry for entry in entries if entry[2] is not None}
+        for score_id, created_at, score in rows:
+            synced[score_id] = (_as_utc(created_at), score, score_id)
+        merged = sorted(synced.values(), key=lambda entry: (entry[0], entry[2]))
+        newest = merged[-1][0] if merged else None
+        # Keep local scores newer than the DB has seen (e.g. still in the write-behind queue)
+        local = [entry for entry in entries if entry[2] is None and (newest is None or entry[0] > newest)]
+        self._history[ticker] = deque(merged + local, maxlen=self.length)
+
+    def warm(self):
+        """Loads the latest scores for every ticker with one query."""
+        rows = run_query(_fetch_all_recent, self.length)
+        by_ticker = {}
+        for score_id, ticker, created_at, score in rows:
+            by_ticker.setdefault(ticker, []).append((score_id, created_at, score))
+        with self._lock:
+            local = {ticker: [entry for entry in entries if entry[2] is None] for ticker, entries in self._history.items()}
+            self._history = {ticker: deque(entries, maxlen=self.length) for ticker, entries in local.items()}
+            for ticker, ticker_rows in by_ticker.items():
+                self._merge(ticker, ticker_rows)
+            self._last_id = max((row[0] for row in rows), default=self._last_id)
+            self._warmed = True
+        print(f"Score history cache warmed for {len(by_ticker)} tickers.")
+
+    def sync(self):
+        """Adds the rows inserted since the last sync (by any process); warms first if needed."""
+        if not self._warmed:
+            return self.warm()
+        rows = run_query(_fetch_since, max(self._last_id - RESYNC_ID_OVERLAP, 0))
+        by_ticker = {}
+        for score_id, ticker, created_at, score in rows:
+            by_ticker.setdefault(ticker, []).append((score_id, created_at, score))
+        with self._lock:
+            for ticker, ticker_rows in by_ticker.items():
+                self._merge(ticker, ticker_rows)
+            self._last_id = max((row[0] for row in rows), default=self._last_id)
+
+    def resync_in_background(self):
+        """Syncs the cache in a background thread, at most once per resync interval."""
+        with self._lock:
+            if self._syncing or time.time() - self._sync_started_at < self.resync_seconds:
+                return
+            self._syncing = True
+            self._sync_started_at = time.time()
+
+        def run():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Score history resync failed: {e}")
+            finally:
+                with self._lock:
+                    self._syncing = False
+
+        threading.Thread(target=run, name="score-history-resync", daemon=True).start()
+
+    def record(self, ticker: str, score: int, created_at: datetime = None):
+        """Appends a freshly inserted score."""
+        created_at = _as_utc(created_at) if created_at else datetime.now(timezone.utc).replace(tzinfo=None)
+        with self._lock:
+            entries = self._history.get(ticker.upper())
+            if entries is None:
+                if not self._warmed:
+                    # Not warmed yet: leave it to the miss path so older rows are loaded too
+                    return
+                # Warmed without this ticker, so it has no older rows
+                entries = self._history[ticker.upper()] = deque(maxlen=self.length)
+            entries.append((created_at, score, None))
+
+    def _entries(self, ticker: str) -> list:
+        """Returns the cached entries for a ticker, loading them from the DB on a miss."""
+        self.resync_in_background()
+        with self._lock:
+            entries = self._history.get(ticker)
+            if entries is not None:
+                return list(entries)
+        rows = run_query(_fetch_recent, ticker, self.length)
+        entries = deque(((_as_utc(created_at), score, score_id) for score_id, created_at, score in rows), maxlen=self.length)
+        with self._lock:
+            entries = self._history.setdefault(ticker, entries)
+            return list(entries)
+
+    def latest_score(self, ticker: str):
+        """Returns the most recent score for a ticker, or None if it has never been scored."""
+        entries = self._entries(ticker.upper())
+        return entries[-1][1] if entries else None
+
+    def history(self, tickers: list) -> dict:
+        """Returns {ticker: [{"date", "score"}, ...]} oldest first, as served by /history."""
+        return {
+            ticker: [{"date": created_at.strftime('%Y-%m-%d %H:%M'), "score": score} for created_at, score, _ in self._entries(ticker)]
+            for ticker in tickers
+        }
+
+
+score_history = ScoreHistoryCache()
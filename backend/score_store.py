@@ -0,0 +1,364 @@
+# In: backend/score_store.py
+#
+# Time-series storage for scores (schema in migrations/002_score_timeseries.sql):
+#   score_points           one typed row per score, partitioned by month, kept RAW_RETENTION_DAYS
+#   score_rollups_hourly   min/max/avg/last score per ticker and hour, kept HOURLY_RETENTION_DAYS
+#   score_rollups_daily    the same per day, kept forever
+# credit_scores stays the system of record and is only trimmed if CREDIT_SCORES_RETENTION_DAYS
+# is set. A maintenance job (cron, or the API when SCORE_MAINTENANCE_SECONDS is set) keeps the
+# rollups current and applies retention; /history reads whichever tier matches the requested range.
+#
+#   python -m backend.score_store maintain
+#   python -m backend.score_store rollup --since 2024-01-01
+
+import os
+import sys
+import math
+import threading
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.append('.')
+from backend.db import run_query
+from common.metrics import span
+
+# Model features with a typed column in score_points (lower-cased; contributions are shap_<name>)
+FEATURES = ['Close', 'High', 'Low', 'Open', 'Volume', 'trend_indicator', 'sentiment', 'positive_events',
+            'negative_events', 'GDP', 'CPI', 'FEDFUNDS', 'UNRATE', 'BAMLH0A0HYM2']
+
+POINT_COLUMNS = (
+    ['score_id', 'ticker', 'created_at', 'score', 'prediction', 'model_version']
+    + [name.lower() for name in FEATURES]
+    + ['base_value']
+    + [f"shap_{name.lower()}" for name in FEATURES]
+)
+
+# Raw score_points partitions are dropped after this many days; 0 keeps them
+RAW_RETENTION_DAYS = float(os.getenv("SCORE_RAW_RETENTION_DAYS", 90))
+HOURLY_RETENTION_DAYS = float(os.getenv("SCORE_HOURLY_RETENTION_DAYS", 400))
+
+# credit_scores rows (and with them their /explanation ids) are deleted after this many days; 0 keeps them
+CREDIT_SCORES_RETENTION_DAYS = float(os.getenv("CREDIT_SCORES_RETENTION_DAYS", 0))
+
+# How often the API process runs the rollup/retention job; 0 (the default) leaves it to the CLI, e.g. from cron
+MAINTENANCE_SECONDS = float(os.getenv("SCORE_MAINTENANCE_SECONDS", 0))
+
+# resolution=auto picks the finest tier that returns at most this many points per ticker
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", 1000))
+
+# Default /history window when only one end of the range is given
+DEFAULT_RANGE_DAYS = 30
+
+RESOLUTIONS = {'raw': None, 'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+# pg_try_advisory_xact_lock key, so only one process runs maintenance at a time
+_LOCK_KEY = 2300231
+
+# Rows rolled up again on every run, so scores that landed late (write-behind, other processes) are counted
+_ROLLUP_OVERLAP = timedelta(hours=1)
+
+# (year, month) partitions this process has already made sure exist
+_ready_months = set()
+
+
+def _utcnow() -> datetime:
+    """Naive UTC, like the created_at columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _number(value):
+    """Float for a typed column, or None for missing / non-numeric values."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def point_row(score_id, ticker: str, created_at: datetime, score: int, features: dict, explanation, model_version: str = None) -> tuple:
+    """A score_points row in POINT_COLUMNS order, from the same values stored in credit_scores."""
+    features = features or {}
+    explanation = explanation if isinstance(explanation, dict) else {}
+    contributions = explanation.get('contributions') or {}
+    return (
+        score_id, ticker.upper(), created_at, int(score), _number(explanation.get('prediction')), model_version,
+        *(_number(features.get(name)) for name in FEATURES),
+        _number(explanation.get('base_value')),
+        *(_number(contributions.get(name)) for name in FEATURES),
+    )
+
+
+@contextmanager
+def _savepoint(cur, action: str):
+    """
+    Runs a score_points write inside a savepoint, so a missing partition or an unmigrated
+    database loses only the typed copy, never the credit_scores change in the same transaction.
+    """
+    cur.execute("SAVEPOINT score_points")
+    try:
+        yield
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT score_points")
+        print(f"⚠️ Could not {action} in score_points: {e}")
+    cur.execute("RELEASE SAVEPOINT score_points")
+
+
+def insert_points(cur, rows: list):
+    with _savepoint(cur, f"write {len(rows)} rows"):
+        # Writers create their own partitions, so typed writes do not depend on maintenance running
+        months = {(row[2].year, row[2].month) for row in rows} - _ready_months
+        for year, month in sorted(months):
+            cur.execute("SELECT ensure_score_partition(%s)", (datetime(year, month, 1),))
+        execute_values(cur, f"INSERT INTO score_points ({', '.join(POINT_COLUMNS)}) VALUES %s", rows, page_size=500)
+        _ready_months.update(months)
+
+
+def copy_points(cur, points):
+    """COPYs CSV rows of POINT_COLUMNS into score_points (bulk loads), inside the same savepoint."""
+    with _savepoint(cur, "copy rows"):
+        cur.copy_expert(f"COPY score_points ({', '.join(POINT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", points)
+
+
+def update_point_explanations(cur, explanations: list):
+    """Fills in the contribution columns of scores whose explanations were deferred: [(score_id, explanation)]."""
+    columns = ['prediction', 'base_value'] + [f"shap_{name.lower()}" for name in FEATURES]
+    rows = []
+    for score_id, explanation in explanations:
+        row = point_row(score_id, '', None, 0, {}, explanation)
+        rows.append((score_id, row[4], row[6 + len(FEATURES)], *row[7 + len(FEATURES):]))
+    with _savepoint(cur, f"update {len(rows)} explanations"):
+        execute_values(
+            cur,
+            f"UPDATE score_points AS p SET {', '.join(f'{column} = v.{column}' for column in columns)} "
+            f"FROM (VALUES %s) AS v (score_id, {', '.join(columns)}) WHERE p.score_id = v.score_id",
+            rows,
+            template="(%s::BIGINT" + ", %s::DOUBLE PRECISION" * len(columns) + ")",
+            page_size=500
+        )
+
+
+def ensure_partitions(cur, start: datetime, end: datetime):
+    """Creates the monthly score_points partitions covering start..end."""
+    month = datetime(start.year, start.month, 1)
+    while month <= end:
+        cur.execute("SELECT ensure_score_partition(%s)", (month,))
+        month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _rollup_hourly(cur, since: datetime):
+    cur.execute("""
+        INSERT INTO score_rollups_hourly (ticker, bucket, min_score, max_score, avg_score, last_score, n)
+        SELECT ticker, date_trunc('hour', created_at), MIN(score), MAX(score), AVG(score),
+               (ARRAY_AGG(score ORDER BY created_at DESC))[1], COUNT(*)
+        FROM score_points
+        WHERE created_at >= date_trunc('hour', %s::TIMESTAMP) AND score >= 0
+        GROUP BY 1, 2
+        ON CONFLICT (ticker, bucket) DO UPDATE SET
+            min_score = EXCLUDED.min_score, max_score = EXCLUDED.max_score, avg_score = EXCLUDED.avg_score,
+            last_score = EXCLUDED.last_score, n = EXCLUDED.n
+    """, (since,))
+    return cur.rowcount
+
+
+def _rollup_daily(cur, since: datetime):
+    cur.execute("""
+        INSERT INTO score_rollups_daily (ticker, bucket, min_score, max_score, avg_score, last_score, n)
+        SELECT ticker, date_trunc('day', bucket), MIN(min_score), MAX(max_score), SUM(avg_score * n) / SUM(n),
+               (ARRAY_AGG(last_score ORDER BY bucket DESC))[1], SUM(n)
+        FROM score_rollups_hourly
+        WHERE bucket >= date_trunc('day', %s::TIMESTAMP)
+        GROUP BY 1, 2
+        ON CONFLICT (ticker, bucket) DO UPDATE SET
+            min_score = EXCLUDED.min_score, max_score = EXCLUDED.max_score, avg_score = EXCLUDED.avg_score,
+            last_score = EXCLUDED.last_score, n = EXCLUDED.n
+    """, (since,))
+    return cur.rowcount
+
+
+def rollup(cur, since: datetime = None) -> dict:
+    """
+    Re-aggregates every hour from `since` (default: the newest hourly bucket minus an
+    overlap) into score_rollups_hourly, then the affected days into score_rollups_daily.
+    """
+    if since is None:
+        cur.execute("SELECT MAX(bucket) FROM score_rollups_hourly")
+        newest = cur.fetchone()[0]
+        if newest is None:
+            cur.execute("SELECT MIN(created_at) FROM score_points")
+            since = cur.fetchone()[0]
+        else:
+            since = newest - _ROLLUP_OVERLAP
+    if since is None:
+        return {"hourly": 0, "daily": 0}
+    return {"hourly": _rollup_hourly(cur, since), "daily": _rollup_daily(cur, since)}
+
+
+def apply_retention(cur, now: datetime = None) -> dict:
+    """
+    Drops raw score_points partitions past RAW_RETENTION_DAYS and hourly rollups past
+    HOURLY_RETENTION_DAYS. credit_scores rows are only deleted when CREDIT_SCORES_RETENTION_DAYS is set.
+    """
+    now = now or _utcnow()
+    removed = {"partitions": 0, "credit_scores": 0, "hourly": 0}
+    if RAW_RETENTION_DAYS > 0:
+        cur.execute("SELECT drop_score_partitions_before(%s)", (now - timedelta(days=RAW_RETENTION_DAYS),))
+        removed["partitions"] = cur.fetchone()[0]
+    if CREDIT_SCORES_RETENTION_DAYS > 0:
+        cur.execute("DELETE FROM credit_scores WHERE created_at < %s", (now - timedelta(days=CREDIT_SCORES_RETENTION_DAYS),))
+        removed["credit_scores"] = cur.rowcount
+    if HOURLY_RETENTION_DAYS > 0:
+        cur.execute("DELETE FROM score_rollups_hourly WHERE bucket < %s", (now - timedelta(days=HOURLY_RETENTION_DAYS),))
+        removed["hourly"] = cur.rowcount
+    return removed
+
+
+def _maintain(cur, since: datetime = None, retention: bool = True):
+    """One maintenance pass in one transaction; returns None if another process holds the lock."""
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (_LOCK_KEY,))
+    if not cur.fetchone()[0]:
+        return None
+    now = _utcnow()
+    # The current and next month, so inserts never hit a missing partition
+    ensure_partitions(cur, now, now + timedelta(days=31))
+    result = rollup(cur, since)
+    if retention:
+        result.update(apply_retention(cur, now))
+    return result
+
+
+def maintain(since: datetime = None, retention: bool = True):
+    """Rolls up scores from `since` and, unless retention=False (backfills), applies retention."""
+    with span("score_maintenance"):
+        return run_query(_maintain, since, retention)
+
+
+class ScoreMaintenance:
+    """Runs the rollup/retention pass every MAINTENANCE_SECONDS in a background thread."""
+
+    def __init__(self, interval: float = MAINTENANCE_SECONDS):
+        self.interval = interval
+        self.runs = self.skipped = self.failures = 0
+        self.last_result = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def run_once(self):
+        try:
+            result = maintain()
+        except Exception as e:
+            self.failures += 1
+            print(f"❌ Score maintenance failed: {e}")
+            return None
+        if result is None:
+            self.skipped += 1
+        else:
+            self.runs += 1
+            self.last_result = result
+        return result
+
+    def start_in_background(self):
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+
+        def run():
+            while True:
+                self.run_once()
+                if self._stop.wait(self.interval):
+                    return
+
+        self._thread = threading.Thread(target=run, name="score-maintenance", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "skipped": self.skipped, "failures": self.failures, "last": self.last_result}
+
+
+score_maintenance = ScoreMaintenance()
+
+
+def choose_resolution(start: datetime, end: datetime, now: datetime = None) -> str:
+    """The finest tier that still holds `start` and returns at most HISTORY_MAX_POINTS buckets."""
+    now = now or _utcnow()
+    width = end - start
+    if (RAW_RETENTION_DAYS <= 0 or start >= now - timedelta(days=RAW_RETENTION_DAYS)) and width <= timedelta(days=2):
+        return 'raw'
+    if (HOURLY_RETENTION_DAYS <= 0 or start >= now - timedelta(days=HOURLY_RETENTION_DAYS)) \
+            and width / RESOLUTIONS['hour'] <= HISTORY_MAX_POINTS:
+        return 'hour'
+    return 'day'
+
+
+def _fetch_raw(cur, tickers: list, start: datetime, end: datetime) -> list:
+    cur.execute("""
+        SELECT ticker, created_at, score FROM score_points
+        WHERE ticker = ANY(%s) AND created_at >= %s AND created_at < %s AND score >= 0
+        ORDER BY ticker, created_at
+    """, (tickers, start, end))
+    return cur.fetchall()
+
+
+def _fetch_rollups(cur, table: str, tickers: list, start: datetime, end: datetime) -> list:
+    cur.execute(f"""
+        SELECT ticker, bucket, last_score, min_score, max_score, avg_score, n FROM {table}
+        WHERE ticker = ANY(%s) AND bucket >= date_trunc(%s, %s::TIMESTAMP) AND bucket < %s
+        ORDER BY ticker, bucket
+    """, (tickers, 'hour' if table == 'score_rollups_hourly' else 'day', start, end))
+    return cur.fetchall()
+
+
+def _as_naive_utc(moment: datetime) -> datetime:
+    if moment is not None and moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def history_range(tickers: list, start: datetime = None, end: datetime = None, resolution: str = 'auto') -> tuple:
+    """
+    Returns (resolution, {ticker: [{"date", "score", ...}, ...]}) for start <= date < end,
+    oldest first. end defaults to now and start to DEFAULT_RANGE_DAYS before end. Rollup
+    points also carry min, max, avg and count; "score" is the last score in the bucket.
+    """
+    end = _as_naive_utc(end) or _utcnow()
+    start = _as_naive_utc(start) or end - timedelta(days=DEFAULT_RANGE_DAYS)
+    if start >= end:
+        raise ValueError("'from' must be earlier than 'to'.")
+    if resolution == 'auto':
+        resolution = choose_resolution(start, end)
+    history = {ticker: [] for ticker in tickers}
+    if resolution == 'raw':
+        for ticker, created_at, score in run_query(_fetch_raw, tickers, start, end):
+            history[ticker].append({"date": created_at.strftime('%Y-%m-%d %H:%M'), "score": score})
+        return resolution, history
+
+    table, date_format = ('score_rollups_hourly', '%Y-%m-%d %H:%M') if resolution == 'hour' else ('score_rollups_daily', '%Y-%m-%d')
+    for ticker, bucket, last, low, high, avg, count in run_query(_fetch_rollups, table, tickers, start, end):
+        history[ticker].append({
+            "date": bucket.strftime(date_format), "score": last,
+            "min": low, "max": high, "avg": round(avg, 2), "count": count,
+        })
+    return resolution, history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the score time-series tables.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("maintain", help="Create partitions, update rollups and apply retention once.")
+    rollup_parser = subparsers.add_parser("rollup", help="Rebuild the rollups from a date (e.g. after a backfill), without retention.")
+    rollup_parser.add_argument("--since", required=True, type=datetime.fromisoformat, help="ISO date or datetime.")
+    args = parser.parse_args(argv)
+
+    if args.command == "rollup":
+        # A rebuild after a backfill must not apply retention to the rows it just loaded
+        result = maintain(args.since, retention=False)
+    else:
+        result = maintain()
+    if result is None:
+        sys.exit("❌ Another process is running score maintenance; try again shortly.")
+    print(f"✅ Score maintenance: {result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,85 @@
 # In: backend/scoring_engine.py
 
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-import joblib
-import shap
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-
-try:
-    model = joblib.load('credit_model.pkl')
-    explainer = shap.TreeExplainer(model)
-    MODEL_FEATURES = model.feature_names_in_
-    print("✅ Model and SHAP explainer loaded successfully.")
-    print(f"Model expects features: {MODEL_FEATURES}")
-except Exception as e:
-    model = None
-    explainer = None
-    MODEL_FEATURES = []
-    print(f"❌ Model loading failed: {e}. Scoring will be disabled.")
-
-
-def engineer_features(ticker: str, market_data: list, news_data: list, macro_data: dict) -> pd.DataFrame:
+from common.sentiment import analyze_articles
+from backend.model_registry import model_manager
+from common.metrics import span
+
+# Maximum number of distinct feature vectors whose SHAP values are kept in memory
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", 10000))
+
+
+def load_model() -> bool:
+    """
+    Loads the serving model version on first use (see backend/model_registry.py).
+    Returns False if no model is available.
+    """
+    return model_manager.get() is not None
+
+
+def model_features() -> list:
+    """Feature columns the serving model expects, in order."""
+    active = model_manager.get()
+    return active.features if active is not None else []
+
+
+def warmup() -> dict:
+    """Loads the model and explainer and runs one prediction and explanation end to end."""
+    return model_manager.warmup()
+
+
+def model_status() -> dict:
+    return model_manager.status()
+
+
+def engineer_features(ticker: str, market_data, news_data: list, macro_data: dict, feature_state=None) -> pd.DataFrame:
     """
     Engineers features for a LIVE request, ensuring they match the training data format.
+    market_data may be a list of row dicts or a dict of columns.
+    When a TickerFeatureState is given (see backend/feature_state.py), the price features
+    are read from it in O(1) instead of being recomputed from market_data.
     """
-    market_df = pd.DataFrame(market_data)
-    latest_market_data = market_df.iloc[-1]
-    
-    features = {
-        'Open': latest_market_data.get(f'Open_{ticker.upper()}'),
-        'High': latest_market_data.get(f'High_{ticker.upper()}'),
-        'Low': latest_market_data.get(f'Low_{ticker.upper()}'),
-        'Close': latest_market_data.get(f'Close_{ticker.upper()}'),
-        'Volume': latest_market_data.get(f'Volume_{ticker.upper()}'),
-    }
-
-    # --- NEW: TREND INDICATOR LOGIC ---
-    close_col = f'Close_{ticker.upper()}'
-    if close_col in market_df.columns:
-        market_df[close_col] = pd.to_numeric(market_df[close_col])
-        # Short-term vs Long-term moving average
-        ma_short = market_df[close_col].rolling(window=30).mean().iloc[-1]
-        ma_long = market_df[close_col].rolling(window=90).mean().iloc[-1]
-        # Avoid division by zero
-        features['trend_indicator'] = ma_short / ma_long if ma_long > 0 else 1
-    # ------------------------------------
+    load_model()
+    with span("engineer_features"):
+        return _engineer_features(ticker, market_data, news_data, macro_data, feature_state)
 
-    if news_data:
-        news_df = pd.DataFrame(news_data)
-        analyzer = SentimentIntensityAnalyzer()
+
+def _engineer_features(ticker: str, market_data, news_data: list, macro_data: dict, feature_state) -> pd.DataFrame:
+    if feature_state is not None:
+        features = feature_state.features()
+    else:
+        market_df = pd.DataFrame(market_data)
+        latest_market_data = market_df.iloc[-1]
         
-        NEGATIVE_KEYWORDS = ['layoffs', 'debt', 'downgrade', 'lawsuit', 'investigation', 'recall', 'outage', 'cuts', 'fine']
-        POSITIVE_KEYWORDS = ['expansion', 'profit', 'upgrade', 'hiring', 'record', 'partnership', 'launch', 'beats', 'growth']
+        features = {
+            'Open': latest_market_data.get(f'Open_{ticker.upper()}'),
+            'High': latest_market_data.get(f'High_{ticker.upper()}'),
+            'Low': latest_market_data.get(f'Low_{ticker.upper()}'),
+            'Close': latest_market_data.get(f'Close_{ticker.upper()}'),
+            'Volume': latest_market_data.get(f'Volume_{ticker.upper()}'),
+        }
 
-        news_df['sentiment'] = news_df['title'].apply(lambda x: analyzer.polarity_scores(x)['compound'])
-        features['sentiment'] = news_df['sentiment'].mean()
-        features['positive_events'] = sum(1 for title in news_df['title'] if any(kw in title.lower() for kw in POSITIVE_KEYWORDS))
-        features['negative_events'] = sum(1 for title in news_df['title'] if any(kw in title.lower() for kw in NEGATIVE_KEYWORDS))
+        # --- NEW: TREND INDICATOR LOGIC ---
+        close_col = f'Close_{ticker.upper()}'
+        if close_col in market_df.columns:
+            market_df[close_col] = pd.to_numeric(market_df[close_col])
+            # Short-term vs Long-term moving average
+            ma_short = market_df[close_col].rolling(window=30).mean().iloc[-1]
+            ma_long = market_df[close_col].rolling(window=90).mean().iloc[-1]
+            # Avoid division by zero
+            features['trend_indicator'] = ma_short / ma_long if ma_long > 0 else 1
+        # ------------------------------------
+
+    if news_data:
+        news_summary = analyze_articles(news_data)
+        features['sentiment'] = news_summary['sentiment']
+        features['positive_events'] = news_summary['positive_events']
+        features['negative_events'] = news_summary['negative_events']
 
     if macro_data:
         features.update(macro_data)
@@ -62,31 +87,201 @@ def engineer_features(ticker: str, market_data: list, news_data: list, macro_dat
     features_df = pd.DataFrame([features])
     
     # Ensure all required columns exist and are in the correct order
-    for col in MODEL_FEATURES:
+    model_columns = model_features()
+    for col in model_columns:
         if col not in features_df.columns:
             features_df[col] = 0
             
-    return features_df[MODEL_FEATURES]
+    return features_df[model_columns]
+
+
+def trend_indicators(close) -> np.ndarray:
+    """
+    30-day over 90-day moving average of Close at every date, as engineer_features
+    computes it for the latest one (1 where the long average is missing or zero).
+    Takes a Close series or a frame of Close columns; returns an array of the same shape.
+    """
+    ma_short = close.rolling(window=30).mean().to_numpy()
+    ma_long = close.rolling(window=90).mean().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(ma_long > 0, ma_short / ma_long, 1)
+
+
+def engineer_features_many(tickers: list, market_data: pd.DataFrame, news_data: dict, macro_data: dict,
+                           feature_states: dict = None) -> pd.DataFrame:
+    """
+    Engineers features for a batch of tickers in one pass. Produces the same values as
+    engineer_features, one row per ticker (indexed by ticker).
+
+    Args:
+        tickers (list): Ticker symbols to build rows for.
+        market_data (pd.DataFrame): A multi-ticker download with flattened 'Field_TICKER' columns.
+        news_data (dict): Maps each ticker to its list of article dicts.
+        macro_data (dict): Latest macroeconomic indicators, shared by every row.
+        feature_states (dict): Optional ticker -> TickerFeatureState; price features for
+                               these tickers are read from the state instead.
+    """
+    load_model()
+    with span("engineer_features_batch"):
+        return _engineer_features_many(tickers, market_data, news_data, macro_data, feature_states)
+
+
+def _engineer_features_many(tickers: list, market_data: pd.DataFrame, news_data: dict, macro_data: dict,
+                            feature_states: dict) -> pd.DataFrame:
+    tickers = [ticker.upper() for ticker in tickers]
+    features_df = pd.DataFrame(index=pd.Index(tickers, name='ticker'))
+
+    if not market_data.empty:
+        latest_market_data = market_data.iloc[-1]
+        for field in ['Open', 'High', 'Low', 'Close', 'Volume']:
+            features_df[field] = [latest_market_data.get(f'{field}_{ticker}') for ticker in tickers]
+
+        # Rolling means for every ticker at once, on the Close columns only
+        close_cols = [f'Close_{ticker}' for ticker in tickers if f'Close_{ticker}' in market_data.columns]
+        if close_cols:
+            trend = trend_indicators(market_data[close_cols].apply(pd.to_numeric))[-1]
+            trend_by_ticker = dict(zip([col[len('Close_'):] for col in close_cols], trend))
+            features_df['trend_indicator'] = [trend_by_ticker.get(ticker, 0) for ticker in tickers]
+
+    if feature_states:
+        for ticker, state in feature_states.items():
+            for name, value in state.features().items():
+                features_df.loc[ticker.upper(), name] = value
+
+    # Stored articles carry their sentiment; others hit the headline cache, so shared articles are scored once
+    news_rows = {}
+    for ticker in tickers:
+        articles = news_data.get(ticker) or []
+        if articles:
+            news_summary = analyze_articles(articles)
+            news_rows[ticker] = {name: news_summary[name] for name in ['sentiment', 'positive_events', 'negative_events']}
+    if news_rows:
+        features_df = features_df.join(pd.DataFrame.from_dict(news_rows, orient='index'))
+
+    if macro_data:
+        for name, value in macro_data.items():
+            features_df[name] = value
+
+    # Missing columns default to 0, as in engineer_features
+    for col in ['sentiment', 'positive_events', 'negative_events']:
+        if col in features_df.columns:
+            features_df[col] = features_df[col].fillna(0)
+    return features_df.reindex(columns=model_features(), fill_value=0)
 
 
-def calculate_credit_score(features_df: pd.DataFrame) -> dict:
-    if model is None or features_df.empty:
+def predict(features_df: pd.DataFrame, bundle=None):
+    """Raw model predictions for a feature matrix, with the given ModelVersion or the serving one."""
+    return (bundle or model_manager.get()).predict(features_df)
+
+
+def to_scores(predicted_values) -> np.ndarray:
+    """Maps raw model predictions onto the 0-100 credit score scale."""
+    return np.clip(50 + (np.asarray(predicted_values) * 2000), 0, 100).astype(int)
+
+
+def calculate_credit_score(features_df: pd.DataFrame, explain: str = 'sync') -> dict:
+    if not load_model() or features_df.empty:
         return {"score": -1, "explanation": "Model not loaded or features missing."}
 
-    predicted_value = model.predict(features_df)[0]
-    
-    score = 50 + (predicted_value * 2000)
-    score = max(0, min(100, score))
-    
-    shap_values = explainer.shap_values(features_df)
-    
-    feature_names = features_df.columns
-    contributions = {name: round(val, 5) for name, val in zip(feature_names, shap_values[0])}
-    
-    explanation = {
-        "base_value": round(explainer.expected_value[0], 5),
-        "prediction": round(predicted_value, 5),
-        "contributions": contributions
-    }
-    
-    return {"score": int(score), "explanation": explanation}
\ No newline at end of file
+    return score_many(features_df, explain=explain)[0]
+
+
+def score_many(features_df: pd.DataFrame, explain: str = 'sync') -> list:
+    """
+    Scores every row of a feature matrix with a single model.predict and a single
+    batched TreeSHAP call. Returns one result dict per row, in row order.
+
+    With explain='none' or 'deferred' the SHAP step is skipped and each result carries
+    the raw 'prediction' needed to explain it later (see backend/explanations.py).
+    """
+    # One version for the whole batch, even if a hot-swap lands mid-request
+    active = model_manager.get()
+    if active is None or features_df.empty:
+        return [{"score": -1, "explanation": "Model not loaded or features missing."} for _ in range(len(features_df))]
+    if list(features_df.columns) != active.features:
+        features_df = features_df.reindex(columns=active.features, fill_value=0)
+
+    with span("predict"):
+        predicted_values = predict(features_df, active)
+
+    scores = to_scores(predicted_values)
+
+    if explain == 'sync':
+        explanations = explain_many(features_df, predicted_values, active)
+    else:
+        explanations = [None] * len(features_df)
+
+    return [
+        {"score": int(score), "prediction": float(predicted_value), "explanation": explanation,
+         "model_version": active.version}
+        for score, predicted_value, explanation in zip(scores, predicted_values, explanations)
+    ]
+
+
+class ExplanationMemo:
+    """Bounded LRU of SHAP contributions keyed by a hash of the feature vector."""
+
+    def __init__(self, max_size: int = EXPLANATION_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(row: np.ndarray) -> bytes:
+        return hashlib.blake2b(np.ascontiguousarray(row, dtype=np.float64).tobytes(), digest_size=16).digest()
+
+    def get(self, key: bytes):
+        with self._lock:
+            contributions = self._entries.get(key)
+            if contributions is not None:
+                self._entries.move_to_end(key)
+            return contributions
+
+    def put(self, key: bytes, contributions: dict):
+        with self._lock:
+            self._entries[key] = contributions
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+explanation_memo = ExplanationMemo()
+
+# Contributions depend on the model, so a new version starts with an empty memo
+model_manager.on_swap(lambda old_version, new_version: explanation_memo.clear())
+
+
+def explain_many(features_df: pd.DataFrame, predicted_values, bundle=None) -> list:
+    """
+    Builds SHAP explanations for every row. Rows whose feature vector was explained before
+    are served from the memo; the rest go through one batched TreeSHAP call.
+
+    `bundle` is the ModelVersion that made the predictions (default: the serving one).
+    """
+    bundle = bundle or model_manager.get()
+    values = features_df.to_numpy(dtype='float64')
+    keys = [explanation_memo.key(row) + bundle.version.encode() for row in values]
+    contributions = [explanation_memo.get(key) for key in keys]
+
+    explainer = bundle.explainer()
+    missing = [i for i, found in enumerate(contributions) if found is None]
+    if missing:
+        with span("shap"):
+            shap_values = explainer.shap_values(features_df.iloc[missing])
+        feature_names = features_df.columns
+        for i, row_shap in zip(missing, shap_values):
+            contributions[i] = {name: round(val, 5) for name, val in zip(feature_names, row_shap)}
+            explanation_memo.put(keys[i], contributions[i])
+
+    base_value = round(explainer.expected_value[0], 5)
+    return [
+        {
+            "base_value": base_value,
+            "prediction": round(predicted_value, 5),
+            "contributions": row_contributions
+        }
+        for predicted_value, row_contributions in zip(predicted_values, contributions)
+    ]
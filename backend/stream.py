@@ -0,0 +1,74 @@
+# In: backend/stream.py
+
+import os
+import json
+import asyncio
+from backend.pubsub import score_bus
+
+# Events buffered per client; a client that falls further behind loses the oldest ones
+CLIENT_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 100))
+
+# An SSE comment is sent this often so proxies keep idle connections open
+HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", 15))
+
+
+def format_sse(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class ScoreStream:
+    """
+    Fans score events from the bus out to Server-Sent Events clients. One subscription
+    per process; each client gets its own bounded queue filtered to its tickers.
+    """
+
+    def __init__(self, bus=score_bus, queue_size: int = CLIENT_QUEUE_SIZE):
+        self.bus = bus
+        self.queue_size = queue_size
+        self._clients = {}   # asyncio.Queue -> set of tickers (None for all)
+        self._loop = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Subscribes to the bus; events are handed to `loop`, which serves the clients."""
+        if self._loop is None:
+            self._loop = loop
+            self.bus.subscribe(self._on_event)
+
+    def _on_event(self, event: dict):
+        # Called from whichever thread published or received the event
+        self._loop.call_soon_threadsafe(self._fan_out, event)
+
+    def _fan_out(self, event: dict):
+        for client, tickers in self._clients.items():
+            if tickers is not None and event.get("ticker") not in tickers:
+                continue
+            if client.full():
+                client.get_nowait()
+            client.put_nowait(event)
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    async def events(self, tickers: set, snapshot: dict = None):
+        """
+        Yields SSE messages for one client until it disconnects: first a snapshot of the
+        latest known scores, then score/alert events as they arrive, with heartbeats.
+        """
+        client = asyncio.Queue(maxsize=self.queue_size)
+        self._clients[client] = tickers
+        try:
+            if snapshot:
+                yield format_sse("snapshot", snapshot)
+            while True:
+                try:
+                    event = await asyncio.wait_for(client.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event.get("type", "score"), event)
+        finally:
+            self._clients.pop(client, None)
+
+
+score_stream = ScoreStream()
@@ -0,0 +1,231 @@
+# In: backend/tree_engine.py
+
+import os
+import json
+import shutil
+import numpy as np
+
+# How a split routes missing values (LightGBM's MissingType; sklearn trees use NAN)
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+MISSING_TYPES = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+
+# LightGBM treats |x| <= kZeroThreshold as zero
+ZERO_THRESHOLD = 1e-35
+
+# Arrays persisted by CompiledEnsemble.save, one .npy file each
+ARRAY_FIELDS = ['feature', 'threshold', 'left', 'right', 'default_child', 'missing_type', 'value', 'roots']
+
+
+class CompiledEnsemble:
+    """
+    A tree ensemble flattened into contiguous NumPy arrays (one slot per node across all
+    trees). Leaves point to themselves with an infinite threshold, so every row can walk
+    every tree in lock-step with a few vectorized gathers per level.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_child, missing_type, value,
+                 roots, max_depth, aggregation, float32_inputs, feature_names=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.default_child = np.ascontiguousarray(default_child, dtype=np.intp)
+        self.missing_type = np.ascontiguousarray(missing_type, dtype=np.int8)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.aggregation = aggregation          # 'mean' (random forest) or 'sum' (boosting)
+        self.float32_inputs = float32_inputs    # sklearn compares float32-rounded inputs
+        self.feature_names = feature_names
+        self.is_leaf = self.left == np.arange(len(self.left))
+        self._has_zero_missing = bool((self.missing_type == MISSING_ZERO).any())
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def save(self, path: str):
+        """Writes the arrays as .npy files in a directory, replacing any previous copy atomically."""
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in ARRAY_FIELDS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(self, name))
+        meta = {
+            'max_depth': self.max_depth,
+            'aggregation': self.aggregation,
+            'float32_inputs': self.float32_inputs,
+            'feature_names': None if self.feature_names is None else [str(name) for name in self.feature_names],
+        }
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r') -> 'CompiledEnsemble':
+        """
+        Loads a saved ensemble. With mmap_mode='r' the arrays are memory-mapped, so every
+        process serving the same file shares one copy of the pages.
+        """
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_FIELDS}
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['feature_names'] is not None:
+            meta['feature_names'] = np.asarray(meta['feature_names'], dtype=object)
+        return cls(**arrays, **meta)
+
+    def _prepare(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.float32_inputs:
+            X = X.astype(np.float32).astype(np.float64)
+        return np.ascontiguousarray(X)
+
+    def apply(self, X) -> np.ndarray:
+        """Returns the leaf index reached in every tree, shape (n_rows, n_trees)."""
+        X = self._prepare(X)
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+        route_missing = self._has_zero_missing or bool(np.isnan(X).any())
+
+        # One slot per (row, tree); only slots still inside a tree are walked further
+        leaves = np.broadcast_to(self.roots, (n_rows, self.n_trees)).ravel().copy()
+        active = np.arange(len(leaves))
+        nodes = leaves.copy()
+        row_offsets = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+
+        for depth in range(self.max_depth):
+            x = X_flat[row_offsets + self.feature[nodes]]
+            if route_missing:
+                nodes = self._route_missing(x, nodes)
+            else:
+                nodes = np.where(x <= self.threshold[nodes], self.left[nodes], self.right[nodes])
+            # Most trees are far shallower than the deepest one: drop finished slots
+            if depth % 4 == 3:
+                leaves[active] = nodes
+                walking = ~self.is_leaf[nodes]
+                active, nodes, row_offsets = active[walking], nodes[walking], row_offsets[walking]
+                if not len(active):
+                    break
+        leaves[active] = nodes
+        return leaves.reshape(n_rows, self.n_trees)
+
+    def _route_missing(self, x, nodes) -> np.ndarray:
+        missing_type = self.missing_type[nodes]
+        is_nan = np.isnan(x)
+        # Non-NaN-aware splits see NaN as 0.0
+        x = np.where(is_nan & (missing_type != MISSING_NAN), 0.0, x)
+        to_default = (is_nan & (missing_type == MISSING_NAN)) | ((missing_type == MISSING_ZERO) & (np.abs(x) <= ZERO_THRESHOLD))
+        next_nodes = np.where(x <= self.threshold[nodes], self.left[nodes], self.right[nodes])
+        return np.where(to_default, self.default_child[nodes], next_nodes)
+
+    def predict(self, X) -> np.ndarray:
+        """Predicts one value per row; accepts a single row or a 2D batch (array or DataFrame)."""
+        leaf_values = self.value[self.apply(X)]
+        # Accumulate tree by tree, in order, as sklearn and LightGBM do
+        total = np.cumsum(leaf_values, axis=1)[:, -1]
+        if self.aggregation == 'mean':
+            return total / self.n_trees
+        return total
+
+
+def _compile_sklearn(model) -> CompiledEnsemble:
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None:
+        estimators = [model]   # a single DecisionTreeRegressor
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise NotImplementedError("Only single-output tree models can be compiled.")
+
+    arrays = {name: [] for name in ['feature', 'threshold', 'left', 'right', 'default_child', 'missing_type', 'value']}
+    roots, offset, max_depth = [], 0, 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        n = tree.node_count
+        ids = np.arange(n) + offset
+        leaf = tree.children_left == -1
+        left = np.where(leaf, ids, tree.children_left + offset)
+        right = np.where(leaf, ids, tree.children_right + offset)
+        go_left = getattr(tree, 'missing_go_to_left', np.zeros(n, dtype=bool)).astype(bool)
+
+        arrays['feature'].append(np.where(leaf, 0, tree.feature))
+        arrays['threshold'].append(np.where(leaf, np.inf, tree.threshold))
+        arrays['left'].append(left)
+        arrays['right'].append(right)
+        arrays['default_child'].append(np.where(go_left, left, right))
+        arrays['missing_type'].append(np.where(leaf, MISSING_NONE, MISSING_NAN))
+        arrays['value'].append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    return CompiledEnsemble(
+        **{name: np.concatenate(parts) for name, parts in arrays.items()},
+        roots=roots,
+        max_depth=max_depth,
+        aggregation='mean' if hasattr(model, 'estimators_') else 'sum',
+        float32_inputs=True,
+        feature_names=getattr(model, 'feature_names_in_', None)
+    )
+
+
+def _compile_lightgbm(model) -> CompiledEnsemble:
+    booster = getattr(model, 'booster_', model)
+    dump = booster.dump_model(num_iteration=getattr(model, 'best_iteration_', None) or None)
+    if dump.get('num_class', 1) != 1 or dump.get('objective', '').split()[0] not in ('regression', 'regression_l2'):
+        raise NotImplementedError("Only single-output L2 regression LightGBM models can be compiled.")
+
+    feature, threshold, left, right, default_child, missing_type, value = ([] for _ in range(7))
+    roots, max_depth = [], 0
+
+    def add_node(node, depth):
+        nonlocal max_depth
+        index = len(value)
+        feature.append(0); threshold.append(np.inf); left.append(index); right.append(index)
+        default_child.append(index); missing_type.append(MISSING_NONE); value.append(0.0)
+        if 'leaf_value' in node or 'split_feature' not in node:
+            value[index] = node.get('leaf_value', 0.0)
+            max_depth = max(max_depth, depth)
+            return index
+        if node.get('decision_type', '<=') != '<=':
+            raise NotImplementedError("Categorical LightGBM splits cannot be compiled.")
+        feature[index] = node['split_feature']
+        threshold[index] = node['threshold']
+        missing_type[index] = MISSING_TYPES[node.get('missing_type', 'None')]
+        left[index] = add_node(node['left_child'], depth + 1)
+        right[index] = add_node(node['right_child'], depth + 1)
+        default_child[index] = left[index] if node.get('default_left', True) else right[index]
+        return index
+
+    for tree_info in dump['tree_info']:
+        roots.append(add_node(tree_info['tree_structure'], 0))
+
+    return CompiledEnsemble(
+        feature, threshold, left, right, default_child, missing_type, value,
+        roots=roots,
+        max_depth=max_depth,
+        aggregation='sum',
+        float32_inputs=False,
+        feature_names=np.asarray(dump.get('feature_names', []))
+    )
+
+
+def compile_model(model) -> CompiledEnsemble:
+    """
+    Flattens a trained sklearn tree/forest regressor or LightGBM regressor into a
+    CompiledEnsemble. Raises NotImplementedError for anything else.
+    """
+    if hasattr(model, 'booster_') or type(model).__name__ == 'Booster':
+        return _compile_lightgbm(model)
+    if hasattr(model, 'tree_') or (hasattr(model, 'estimators_') and hasattr(model.estimators_[0], 'tree_')):
+        return _compile_sklearn(model)
+    raise NotImplementedError(f"Cannot compile model of type {type(model).__name__}.")
+
+
+def check_parity(model, compiled: CompiledEnsemble, X) -> float:
+    """Returns the largest absolute difference between the model's and the compiled predictions."""
+    expected = model.predict(X)
+    actual = compiled.predict(X)
+    return float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+
@@ -0,0 +1,143 @@
+# In: benchmarks/fixtures.py
+#
+# Deterministic offline stand-ins for Yahoo Finance, NewsAPI, FRED and Postgres, built
+# from training_dataset.csv, so the hot path can be timed without API keys or a network.
+
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from data_ingestion.price_store import PriceStore, FIELDS
+from data_ingestion.fred_fetcher import SERIES
+
+DATASET_PATH = os.getenv("BENCHMARK_DATASET", "training_dataset.csv")
+
+# Scores per ticker seeded into the history stand-in
+HISTORY_ROWS_PER_TICKER = 500
+
+HEADLINE_TEMPLATES = [
+    "{ticker} posts record profit as cloud growth beats estimates",
+    "{ticker} announces expansion and hiring in new markets",
+    "{ticker} faces lawsuit over product recall",
+    "Analysts issue downgrade on {ticker} citing rising debt",
+    "{ticker} shares flat ahead of earnings",
+    "{ticker} unveils partnership to launch new platform",
+    "Regulators open investigation into {ticker} outage",
+    "{ticker} to cut costs with layoffs in two divisions",
+]
+
+
+def load_dataset(path: str = DATASET_PATH) -> pd.DataFrame:
+    df = pd.read_csv(path, parse_dates=['date'])
+    df['ticker'] = df['ticker'].astype(str)
+    return df
+
+
+class OfflineSources:
+    """
+    Canned market, news and macro payloads in the shapes the real fetchers return,
+    with a private price store seeded from the dataset.
+    """
+
+    def __init__(self, dataset: pd.DataFrame, news_per_ticker: int = 20):
+        self.dataset = dataset
+        self.tickers = sorted(dataset['ticker'].unique())
+        self.price_store = PriceStore(tempfile.mkdtemp(prefix="bench-prices-"))
+        for ticker, rows in dataset.groupby('ticker'):
+            self.price_store._merge(ticker, rows.set_index('date')[FIELDS])
+        latest = dataset.sort_values('date').iloc[-1]
+        self.macro = {name: float(latest[name]) for name in SERIES if name in dataset.columns}
+        self._news = {ticker: self._make_news(ticker, news_per_ticker) for ticker in self.tickers}
+
+    @staticmethod
+    def _make_news(ticker: str, count: int) -> pd.DataFrame:
+        published = datetime(2025, 1, 31, 16, 0)
+        articles = [
+            {
+                "publishedAt": (published - timedelta(hours=6 * i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                "title": HEADLINE_TEMPLATES[i % len(HEADLINE_TEMPLATES)].format(ticker=ticker),
+                "description": "",
+                "source": {"id": None, "name": "Benchmark Wire"},
+                "url": f"https://news.example/{ticker.lower()}/{i}",
+            }
+            for i in range(count)
+        ]
+        return pd.DataFrame(articles)
+
+    def load_ticker_data(self, tickers: list, period: str = "1y") -> pd.DataFrame:
+        """Stand-in for yahoo_finance_fetcher.load_ticker_data (no upstream refresh)."""
+        frames = [self.price_store.frame(ticker, period=period) for ticker in tickers]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+        return frames[0] if len(frames) == 1 else pd.concat(frames, axis=1)
+
+    def fetch_news_headlines(self, query: str, language='en', page_size=20) -> pd.DataFrame:
+        """Stand-in for news_fetcher.fetch_news_headlines; the ticker is the first word of the query."""
+        news = self._news.get(query.split()[0].upper())
+        return news.head(page_size).copy() if news is not None else pd.DataFrame()
+
+    def fetch_macro_data(self) -> dict:
+        """Stand-in for fred_fetcher.fetch_macro_data."""
+        return dict(self.macro)
+
+    def market_rows(self, ticker: str) -> dict:
+        """One ticker's market data as the column dict /data hands to engineer_features."""
+        market_data = self.load_ticker_data([ticker])
+        market_data.columns = ['_'.join(col) for col in market_data.columns.values]
+        market_df = market_data.reset_index()
+        market_df['Date'] = market_df['Date'].dt.strftime('%Y-%m-%d')
+        return {name: column.tolist() for name, column in market_df.items()}
+
+    def news_records(self, ticker: str) -> list:
+        return self._news[ticker].to_dict(orient='records')
+
+
+class _SQLiteCursor:
+    """Accepts psycopg2-style %s placeholders."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params=()):
+        return self._cursor.execute(re.sub(r'%s', '?', sql), params)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+
+class SQLiteScores:
+    """
+    A credit_scores table in SQLite with a run_query(func, *args) compatible with
+    backend.db.run_query, for the read queries of backend/score_history.py.
+    """
+
+    def __init__(self, tickers: list, rows_per_ticker: int = HISTORY_ROWS_PER_TICKER, seed: int = 0):
+        self.path = os.path.join(tempfile.mkdtemp(prefix="bench-db-"), "scores.db")
+        sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+        rng = np.random.default_rng(seed)
+        start = datetime(2025, 1, 1)
+        rows = [
+            (ticker, (start + timedelta(hours=i)).strftime('%Y-%m-%d %H:%M:%S'), int(score))
+            for ticker in tickers
+            for i, score in enumerate(np.clip(60 + rng.normal(0, 3, rows_per_ticker).cumsum(), 0, 100))
+        ]
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE credit_scores (id INTEGER PRIMARY KEY, ticker TEXT, created_at TIMESTAMP, score INTEGER)")
+            conn.execute("CREATE INDEX idx_credit_scores_ticker_time ON credit_scores (ticker, created_at)")
+            conn.executemany("INSERT INTO credit_scores (ticker, created_at, score) VALUES (?, ?, ?)", rows)
+
+    def run_query(self, func, *args):
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES)
+        try:
+            result = func(_SQLiteCursor(conn.cursor()), *args)
+            conn.commit()
+            return result
+        finally:
+            conn.close()
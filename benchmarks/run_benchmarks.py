@@ -0,0 +1,207 @@
+# In: benchmarks/run_benchmarks.py
+#
+# Times the scoring hot path against offline fixtures (see benchmarks/fixtures.py) and
+# saves the results as JSON, so runs can be compared across commits:
+#
+#   python -m benchmarks.run_benchmarks
+#   python -m benchmarks.run_benchmarks --compare benchmarks/results/<older>.json
+#
+# Needs a trained model (MODEL_PATH or the model registry) and training_dataset.csv.
+# The API cases use FastAPI's TestClient, which needs httpx.
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+from unittest import mock
+import numpy as np
+
+sys.path.append('.')
+from benchmarks.fixtures import OfflineSources, SQLiteScores, load_dataset
+from backend import scoring_engine
+from backend.scoring_engine import engineer_features, engineer_features_many, calculate_credit_score, score_many, explanation_memo
+from backend.feature_state import TickerFeatureState
+from backend.score_history import ScoreHistoryCache
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+# A case counts as a regression when its median is this much slower than the baseline
+REGRESSION_RATIO = 1.2
+
+
+def measure(func, setup=None, repeat: int = 20, warmup: int = 2) -> dict:
+    """Runs func `repeat` times (after `warmup` untimed calls) and summarises the timings in ms."""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {
+        "repeat": repeat,
+        "min_ms": round(float(timings.min()), 4),
+        "median_ms": round(float(np.median(timings)), 4),
+        "mean_ms": round(float(timings.mean()), 4),
+        "p95_ms": round(float(np.percentile(timings, 95)), 4),
+    }
+
+
+def scoring_cases(sources: OfflineSources) -> dict:
+    """Feature engineering, prediction and SHAP, each on its own."""
+    ticker = sources.tickers[0]
+    market = sources.market_rows(ticker)
+    news = sources.news_records(ticker)
+    stored = sources.price_store.read(ticker)
+    state = TickerFeatureState.rebuild(*stored)
+    features_df = engineer_features(ticker, market, news, sources.macro)
+    model = scoring_engine.model_manager.get()
+
+    market_all = sources.load_ticker_data(sources.tickers)
+    market_all.columns = ['_'.join(col) for col in market_all.columns.values]
+    news_all = {t: sources.news_records(t) for t in sources.tickers}
+    batch_df = engineer_features_many(sources.tickers, market_all, news_all, sources.macro)
+
+    return {
+        "engineer_features": lambda: engineer_features(ticker, market, news, sources.macro),
+        "engineer_features_state": lambda: engineer_features(ticker, market, news, sources.macro, feature_state=state),
+        "engineer_features_many": lambda: engineer_features_many(sources.tickers, market_all, news_all, sources.macro),
+        "predict": lambda: model.predict(features_df),
+        # The explanation memo is cleared first, so this times TreeSHAP itself
+        "shap_explain": (lambda: model.explainer().shap_values(features_df), explanation_memo.clear),
+        "calculate_credit_score_no_shap": lambda: calculate_credit_score(features_df, explain='none'),
+        "calculate_credit_score_sync": (lambda: calculate_credit_score(features_df, explain='sync'), explanation_memo.clear),
+        "score_many_no_shap": lambda: score_many(batch_df, explain='none'),
+    }
+
+
+def api_cases(sources: OfflineSources, scores_db: SQLiteScores) -> dict:
+    """/data and /history through TestClient, with the fetchers and database replaced."""
+    try:
+        from fastapi.testclient import TestClient
+    except Exception as e:
+        print(f"⚠️ Skipping API benchmarks ({e}); install httpx to run them.")
+        return {}
+    from backend import main
+
+    patches = [
+        mock.patch.object(main, 'load_ticker_data', sources.load_ticker_data),
+        mock.patch.object(main, 'fetch_news_headlines', sources.fetch_news_headlines),
+        mock.patch.object(main, 'fetch_macro_data', sources.fetch_macro_data),
+        mock.patch.object(main, 'price_store', sources.price_store),
+        mock.patch.object(main, 'enqueue_score', lambda *args, **kwargs: None),
+        mock.patch('backend.score_history.run_query', scores_db.run_query),
+        mock.patch('backend.feature_state.price_store', sources.price_store),
+    ]
+    for patch in patches:
+        patch.start()
+    # Outside a `with` block the lifespan hook (warmup, registry watcher) does not run
+    client = TestClient(main.app)
+    ticker = sources.tickers[0]
+    history_tickers = ','.join(sources.tickers)
+
+    def get(path: str):
+        response = client.get(path)
+        assert response.status_code == 200, f"{path}: {response.status_code} {response.text[:200]}"
+
+    def cold_data():
+        main.score_cache._entries.clear()
+        explanation_memo.clear()
+
+    def cold_history():
+        main.score_history = ScoreHistoryCache()
+
+    return {
+        "api_data_cold": (lambda: get(f"/data/{ticker}"), cold_data),
+        "api_data_no_shap": (lambda: get(f"/data/{ticker}?explain=none"), main.score_cache._entries.clear),
+        "api_data_cached": lambda: get(f"/data/{ticker}"),
+        "api_history_cold": (lambda: get(f"/history/{history_tickers}"), cold_history),
+        "api_history_cached": lambda: get(f"/history/{history_tickers}"),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str):
+    """Prints each case's median against a previous run and flags regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}):")
+    regressions = 0
+    for name, stats in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"  {name:32s} new")
+            continue
+        ratio = stats["median_ms"] / max(before["median_ms"], 1e-9)
+        flag = "⚠️ " if ratio > REGRESSION_RATIO else "  "
+        regressions += ratio > REGRESSION_RATIO
+        print(f"{flag}{name:32s} {before['median_ms']:10.3f} -> {stats['median_ms']:10.3f} ms  ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring hot path offline.")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text.")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per case (default: %(default)s).")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>-<commit>.json).")
+    parser.add_argument("--compare", help="A previous results file to compare against.")
+    parser.add_argument("--skip-api", action="store_true", help="Skip the TestClient cases.")
+    args = parser.parse_args(argv)
+
+    if not scoring_engine.load_model():
+        sys.exit("❌ No model available: train one (notebooks/03) or set MODEL_PATH / MODEL_REGISTRY_PATH.")
+
+    sources = OfflineSources(load_dataset())
+    cases = scoring_cases(sources)
+    if not args.skip_api:
+        cases.update(api_cases(sources, SQLiteScores(sources.tickers)))
+
+    results = {}
+    for name, case in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        func, setup = case if isinstance(case, tuple) else (case, None)
+        # The API logs every request; keep that out of the terminal (not out of the timings)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = measure(func, setup, repeat=args.repeat)
+        print(f"✅ {name:32s} median {results[name]['median_ms']:10.3f} ms   p95 {results[name]['p95_ms']:10.3f} ms")
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "model_version": scoring_engine.model_status()["version"],
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to '{output}'.")
+
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+# In: common/metrics.py
+#
+# Lightweight stage timing. Code wraps each stage in `with span("stage"):`; the duration
+# goes into a histogram served by /metrics (Prometheus text format) and, inside an API
+# request, into that request's Server-Timing header. Lives outside backend/ and is kept
+# dependency-free so the data_ingestion fetchers can time their calls without importing the API.
+
+import os
+import sys
+import time
+import random
+import bisect
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Requests slower than this (ms) have their sampled stacks saved; 0 disables the profiler
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", 0))
+# Fraction of requests sampled while the profiler is enabled
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 1.0))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(".cache", "profiles"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """A Prometheus histogram with one label; observations are a bisect and two adds."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: tuple = BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}   # label value -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def snapshot(self) -> dict:
+        """{label value: {"count", "sum"}} for every series."""
+        with self._lock:
+            return {value: {"count": sum(series[:-1]), "sum": series[-1]} for value, series in self._series.items()}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((value, list(series)) for value, series in self._series.items())
+        for value, series in series_items:
+            label = f'{self.label}="{_escape(value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{label}}} {cumulative}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+stage_seconds = Histogram("credit_stage_duration_seconds", "Time spent in each pipeline stage.", "stage")
+request_seconds = Histogram("credit_request_duration_seconds", "API request latency by route.", "route")
+
+# Spans of the API request being handled, as (stage, seconds); None outside requests.
+# asyncio.to_thread copies the context, so spans in worker threads land here too.
+_request_spans = ContextVar("request_spans", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Times the enclosed block as `stage`."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(stage, elapsed)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def start_request() -> list:
+    """Starts collecting spans for the current request; returns the list they are added to."""
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans: list, total_seconds: float) -> str:
+    """Server-Timing header value: total time per stage in ms, in first-seen order, then the total."""
+    totals = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items()]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def render_metrics(extra_lines: list = None) -> str:
+    """Every histogram in the Prometheus text exposition format."""
+    lines = stage_seconds.render() + request_seconds.render() + (extra_lines or [])
+    return "\n".join(lines) + "\n"
+
+
+class StackSampler:
+    """
+    Sampling profiler: a thread that records the stacks of every other thread at a fixed
+    interval, in the folded format flame graph tools read ("outer;inner;leaf count").
+    Threads blocked in a wait are skipped so idle pool workers do not drown the profile.
+    """
+
+    IDLE_FILES = ('threading.py', 'queue.py', 'selectors.py', 'base_events.py', os.path.join('futures', 'thread.py'))
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> 'StackSampler':
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.endswith(self.IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class SlowRequestProfiler:
+    """Samples requests (when enabled) and keeps the profile only for the slow ones."""
+
+    def __init__(self, slow_ms: float = PROFILE_SLOW_MS, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 output_dir: str = PROFILE_DIR):
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.saved = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_ms > 0
+
+    def start(self):
+        """Returns a running sampler for this request, or None if it is not profiled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        return StackSampler().start()
+
+    def finish(self, sampler, name: str, elapsed_seconds: float):
+        if sampler is None:
+            return
+        sampler.stop()
+        if elapsed_seconds * 1000 < self.slow_ms or not sampler.stacks:
+            return
+        safe_name = "".join(c if c.isalnum() else "_" for c in name).strip("_")
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_name}-{elapsed_seconds * 1000:.0f}ms.folded")
+        sampler.write(path)
+        self.saved += 1
+        print(f"⚠️ Slow request {name} took {elapsed_seconds * 1000:.0f}ms; profile saved to '{path}'.")
+
+
+slow_request_profiler = SlowRequestProfiler()
+
+
+def serve_metrics(port: int):
+    """Serves /metrics from a background thread, for processes without an API (live_worker)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            found = self.path == "/metrics"
+            body = render_metrics().encode() if found else b""
+            self.send_response(200 if found else 404)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"✅ Serving metrics on :{port}/metrics")
+    return server
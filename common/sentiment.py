@@ -0,0 +1,165 @@
+# In: common/sentiment.py
+#
+# Headline sentiment and event keywords, shared by the news store (scores at insert time),
+# the scoring path and the training dataset build.
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+NEGATIVE_KEYWORDS = ['layoffs', 'debt', 'downgrade', 'lawsuit', 'investigation', 'recall', 'outage', 'cuts', 'fine']
+POSITIVE_KEYWORDS = ['expansion', 'profit', 'upgrade', 'hiring', 'record', 'partnership', 'launch', 'beats', 'growth']
+
+# Maximum number of headline sentiment scores kept in memory
+CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", 50000))
+
+# Building the analyzer loads the VADER lexicon, so it is done once per process
+analyzer = SentimentIntensityAnalyzer()
+
+
+def _compile_keywords(positive: list, negative: list):
+    """
+    Compiles both keyword lists into one pattern that finds every keyword occurrence
+    (the lookahead lets matches overlap) in a single scan of the title.
+    Returns the pattern and, per matched keyword, the polarities it implies.
+    """
+    polarity = {kw: 'positive' for kw in positive}
+    polarity.update({kw: 'negative' for kw in negative})
+    # Longest first, so a match at a position is the longest keyword starting there;
+    # any shorter keyword that is a prefix of it is credited through `implied`
+    keywords = sorted(polarity, key=len, reverse=True)
+    implied = {kw: {polarity[other] for other in keywords if kw.startswith(other)} for kw in keywords}
+    pattern = re.compile('(?=(' + '|'.join(re.escape(kw) for kw in keywords) + '))')
+    return pattern, implied
+
+
+_keyword_pattern, _keyword_polarities = _compile_keywords(POSITIVE_KEYWORDS, NEGATIVE_KEYWORDS)
+
+
+def match_events(title: str) -> tuple:
+    """Returns (is_positive_event, is_negative_event) for a headline."""
+    found = set()
+    for match in _keyword_pattern.finditer(title.lower()):
+        found |= _keyword_polarities[match.group(1)]
+        if len(found) == 2:
+            break
+    return 'positive' in found, 'negative' in found
+
+
+class SentimentCache:
+    """Thread-safe LRU of VADER compound scores, keyed by a hash of the headline."""
+
+    def __init__(self, max_size: int = CACHE_SIZE):
+        self.max_size = max_size
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compound(self, title: str) -> float:
+        key = hashlib.blake2b(title.encode('utf-8'), digest_size=16).digest()
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+                self.hits += 1
+                return score
+            self.misses += 1
+        score = analyzer.polarity_scores(title)['compound']
+        with self._lock:
+            self._scores[key] = score
+            if len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+        return score
+
+
+sentiment_cache = SentimentCache()
+
+
+def headline_sentiment(title: str) -> float:
+    """Returns the VADER compound score of a headline, scoring each distinct headline only once."""
+    return sentiment_cache.compound(title)
+
+
+def score_headline(title: str) -> dict:
+    """Sentiment and event flags of one headline, as stored with each article (see data_ingestion/news_store.py)."""
+    is_positive, is_negative = match_events(title)
+    return {"sentiment": headline_sentiment(title), "positive_event": is_positive, "negative_event": is_negative}
+
+
+def analyze_articles(articles: list) -> dict:
+    """
+    Computes everything the scoring path needs from article dicts in one traversal: mean
+    sentiment, positive/negative event counts and the key (most polarised) headline.
+    Articles from the news store already carry their sentiment and event flags, so only
+    articles without them are scored here.
+    """
+    if not articles:
+        return {"sentiment": None, "positive_events": 0, "negative_events": 0, "key_headline": None}
+
+    scores = np.empty(len(articles))
+    positive_events = negative_events = 0
+    key_headline, max_sentiment_score = None, -1
+    for i, article in enumerate(articles):
+        title = article['title']
+        stored = article.get('sentiment')
+        if stored is None or stored != stored:   # not scored yet (NaN when it came through a DataFrame)
+            article = score_headline(title)
+        sentiment = scores[i] = article['sentiment']
+        is_positive, is_negative = article['positive_event'], article['negative_event']
+        positive_events += is_positive
+        negative_events += is_negative
+        if abs(sentiment) > max_sentiment_score:
+            max_sentiment_score = abs(sentiment)
+            key_headline = title
+
+    return {
+        "sentiment": float(scores.mean()),
+        "positive_events": positive_events,
+        "negative_events": negative_events,
+        "key_headline": key_headline,
+    }
+
+
+def trailing_news_features(articles: list, as_of, days: float, limit: int) -> pd.DataFrame:
+    """
+    The news features analyze_articles gives for the articles served at each time in
+    `as_of`: the newest `limit` published within the `days` before it, as
+    news_store.window does at request time. Rows with no such articles get 0, as a
+    missing news feature does when scoring. Returns sentiment, positive_events and
+    negative_events, one row per as_of time.
+    """
+    as_of = pd.DatetimeIndex(as_of)
+    # Articles without stored scores are scored like analyze_articles does
+    articles = [
+        article if article.get('sentiment') is not None and article['sentiment'] == article['sentiment']
+        else {**article, **score_headline(article.get('title') or '')}
+        for article in articles
+    ]
+    news = pd.DataFrame(articles, columns=['publishedAt', 'sentiment', 'positive_event', 'negative_event'])
+    news['publishedAt'] = pd.to_datetime(news['publishedAt'], utc=True).dt.tz_localize(None)
+    news = news.sort_values('publishedAt')
+
+    published = news['publishedAt'].to_numpy(dtype='datetime64[ns]')
+    ends = as_of.to_numpy(dtype='datetime64[ns]')
+    # Articles in [as_of - days, as_of), capped to the newest `limit` of them
+    hi = np.searchsorted(published, ends, side='left')
+    lo = np.maximum(np.searchsorted(published, ends - np.timedelta64(int(days * 86400), 's'), side='left'), hi - limit)
+    count = hi - lo
+
+    def window_sum(values) -> np.ndarray:
+        cumulative = np.concatenate([[0.0], np.cumsum(np.asarray(values, dtype='float64'))])
+        return cumulative[hi] - cumulative[lo]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sentiment = np.where(count > 0, window_sum(news['sentiment']) / count, 0.0)
+    return pd.DataFrame({
+        'sentiment': sentiment,
+        'positive_events': window_sum(news['positive_event']).astype(int),
+        'negative_events': window_sum(news['negative_event']).astype(int),
+    }, index=as_of)
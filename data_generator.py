@@ -3,37 +3,27 @@
 import os
 import sys
 import pandas as pd
-import psycopg2
-import json
 import time
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor, as_completed # New import
 
 # Add the project root to the Python path
 sys.path.append('.')
-from data_ingestion.yahoo_finance_fetcher import fetch_ticker_data
+from data_ingestion.yahoo_finance_fetcher import load_ticker_data
+from data_ingestion.price_store import price_store
 from data_ingestion.news_fetcher import fetch_news_headlines
 from data_ingestion.fred_fetcher import fetch_macro_data
+from backend.db import enqueue_score, score_writer
 from backend.scoring_engine import engineer_features, calculate_credit_score
 
 load_dotenv()
 
-def get_db_connection():
-    # ... (this function remains the same)
-    conn = psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD")
-    )
-    return conn
-
 def generate_data_point(ticker: str):
     # ... (this function remains the same)
     try:
         print(f"--- Processing ticker: {ticker} ---")
         
-        market_data = fetch_ticker_data([ticker], period="1y")
+        market_data = load_ticker_data([ticker], period="1y")
         news_data = fetch_news_headlines(query=f"{ticker} company")
         macro_data = fetch_macro_data()
 
@@ -50,15 +40,9 @@ def generate_data_point(ticker: str):
         features = engineer_features(ticker, market_data_json, news_data_json, macro_data)
         credit_score_result = calculate_credit_score(features)
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        insert_query = "INSERT INTO credit_scores (ticker, score, features, explanation) VALUES (%s, %s, %s, %s)"
-        score_data = (ticker.upper(), credit_score_result['score'], json.dumps(features), json.dumps(credit_score_result['explanation']))
-        cur.execute(insert_query, score_data)
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"Successfully saved score for {ticker}.")
+        enqueue_score(ticker, credit_score_result['score'], features.to_dict(orient='records')[0], credit_score_result['explanation'],
+                      credit_score_result.get('model_version'))
+        print(f"Successfully queued score for {ticker}.")
         return True, ticker
 
     except Exception as e:
@@ -78,6 +62,10 @@ if __name__ == "__main__":
         tasks.extend(target_tickers)
     tasks = tasks[:target_data_points]
     
+    # Bring every ticker's price history up to date with one multi-symbol download,
+    # so the workers below read from the local store
+    price_store.update(target_tickers, period="1y")
+
     # Use a ThreadPoolExecutor to run tasks in parallel
     # max_workers=4 means it will process up to 4 tickers at a time
     with ThreadPoolExecutor(max_workers=4) as executor:
@@ -88,5 +76,7 @@ if __name__ == "__main__":
             if success:
                 generated_count += 1
                 print(f"--> Progress: {generated_count} / {target_data_points} data points generated for {ticker}.")
-            
+
+    # Wait for the write-behind queue to reach the database
+    score_writer.flush()
     print(f"\nData generation complete. Total points generated: {generated_count}")
\ No newline at end of file
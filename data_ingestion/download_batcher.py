@@ -0,0 +1,108 @@
+# In: data_ingestion/download_batcher.py
+
+import os
+import threading
+from concurrent.futures import Future
+import pandas as pd
+import yfinance as yf
+from data_ingestion.rate_limiter import acquire, WAIT_TIMEOUTS
+from common.metrics import span
+
+# Requests arriving within this window share one multi-symbol yf.download
+BATCH_WINDOW_SECONDS = float(os.getenv("YAHOO_BATCH_WINDOW_MS", 50)) / 1000
+MAX_BATCH_SIZE = int(os.getenv("YAHOO_MAX_BATCH_SIZE", 100))
+
+
+class DownloadBatcher:
+    """
+    Coalesces concurrent Yahoo Finance downloads. Requests with the same download
+    parameters (period/start/interval) that arrive within a short window are merged into
+    one multi-symbol yf.download, and the result is split back out per ticker. A ticker
+    already waiting or in flight with the same parameters joins that request instead of
+    starting another one (singleflight).
+    """
+
+    def __init__(self, window: float = BATCH_WINDOW_SECONDS, max_batch_size: int = MAX_BATCH_SIZE):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending = {}     # params key -> {ticker: Future}, not yet sent
+        self._in_flight = {}   # (params key, ticker) -> Future, pending or downloading
+        self._lock = threading.Lock()
+        self.requests = 0      # tickers asked for
+        self.downloads = 0     # yf.download calls made
+
+    @staticmethod
+    def _key(params: dict) -> tuple:
+        return tuple(sorted(params.items()))
+
+    def fetch(self, tickers: list, **params) -> dict:
+        """
+        Downloads bars for `tickers` (keyword arguments are passed to yf.download) and
+        returns {ticker: DataFrame of that ticker's bars, or None if Yahoo returned none}.
+        Raises if the shared download failed.
+        """
+        key = self._key(params)
+        futures, to_send = {}, None
+        with self._lock:
+            for ticker in dict.fromkeys(t.upper() for t in tickers):
+                self.requests += 1
+                future = self._in_flight.get((key, ticker))
+                if future is None:
+                    future = self._in_flight[(key, ticker)] = Future()
+                    batch = self._pending.get(key)
+                    if batch is None:
+                        batch = self._pending[key] = {}
+                        timer = threading.Timer(self.window, self._send, args=(key,))
+                        timer.daemon = True
+                        timer.start()
+                    batch[ticker] = future
+                    if len(batch) >= self.max_batch_size:
+                        to_send = key
+                futures[ticker] = future
+        if to_send is not None:
+            # A full batch goes straight away instead of waiting out the window
+            self._send(to_send)
+        return {ticker: future.result() for ticker, future in futures.items()}
+
+    def _send(self, key: tuple):
+        with self._lock:
+            batch = self._pending.pop(key, None)
+        if not batch:
+            return   # already sent because it filled up
+        tickers = list(batch)
+        try:
+            acquire('yahoo', WAIT_TIMEOUTS['yahoo'])
+            self.downloads += 1
+            print(f"Downloading {len(tickers)} tickers in one request: {tickers}")
+            with span("yahoo_download"):
+                data = yf.download(tickers, progress=False, **dict(key))
+            for ticker, future in batch.items():
+                future.set_result(self._split(data, ticker))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                for ticker in tickers:
+                    self._in_flight.pop((key, ticker), None)
+
+    @staticmethod
+    def _split(data: pd.DataFrame, ticker: str):
+        """Extracts one ticker's columns from a (possibly multi-symbol) download."""
+        if data is None or data.empty:
+            return None
+        if isinstance(data.columns, pd.MultiIndex):
+            if ticker not in data.columns.get_level_values(1):
+                return None
+            bars = data.xs(ticker, axis=1, level=1)
+        else:
+            bars = data
+        bars = bars.dropna(how='all')
+        return bars if not bars.empty else None
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "downloads": self.downloads}
+
+
+yahoo_batcher = DownloadBatcher()
@@ -1,49 +1,236 @@
 # In: data_ingestion/fred_fetcher.py
 
 import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from fredapi import Fred
 from dotenv import load_dotenv
+from data_ingestion.rate_limiter import acquire, WAIT_TIMEOUTS
+from common.metrics import span
 
 load_dotenv()
 
+# Define the series IDs for key economic indicators, with how long a fetched value stays fresh.
+# The lookback bounds the download to recent observations instead of the full history.
+SERIES = {
+    # name: (series_id, ttl_seconds, lookback_days)
+    'GDP': ('GDP', 24 * 3600, 400),                      # Gross Domestic Product (quarterly)
+    'CPI': ('CPIAUCSL', 12 * 3600, 120),                 # Consumer Price Index (monthly)
+    'FEDFUNDS': ('FEDFUNDS', 12 * 3600, 120),            # Federal Funds Effective Rate (monthly)
+    'UNRATE': ('UNRATE', 12 * 3600, 120),                # Unemployment Rate (monthly)
+    'BAMLH0A0HYM2': ('BAMLH0A0HYM2', 3600, 30),          # High-Yield Index Spread (daily)
+}
+
+# Days from an observation's date to its publication, for series without ALFRED vintages:
+# GDP is dated at the start of its quarter and first released about a month after it ends
+RELEASE_LAG_DAYS = {'GDP': 120, 'CPI': 45, 'FEDFUNDS': 32, 'UNRATE': 37, 'BAMLH0A0HYM2': 1}
+
+# Minimum gap between blocking fetches while some series have never been fetched
+COLD_RETRY_SECONDS = 60
+
+SNAPSHOT_PATH = os.getenv("MACRO_CACHE_PATH", os.path.join(".cache", "macro_snapshot.json"))
+
+_fred = None
+_fred_lock = threading.Lock()
+
+
+def _get_client():
+    """Returns the process-wide FRED client, creating it on first use."""
+    global _fred
+    with _fred_lock:
+        if _fred is None:
+            api_key = os.getenv("FRED_API_KEY")
+            if not api_key:
+                print("Error: FRED_API_KEY not found in .env file.")
+                return None
+            _fred = Fred(api_key=api_key)
+        return _fred
+
+
+def _fetch_series(fred, series_id: str, lookback_days: int) -> float:
+    """Fetches the most recent observation of a single series."""
+    start = (datetime.now() - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+    acquire('fred', WAIT_TIMEOUTS['fred'])
+    with span("fred"):
+        data = fred.get_series(series_id, observation_start=start).dropna()
+    if data.empty:
+        # Nothing published inside the lookback window, fall back to the full release
+        acquire('fred', WAIT_TIMEOUTS['fred'])
+        with span("fred"):
+            data = fred.get_series_latest_release(series_id).dropna()
+    return float(data.iloc[-1])
+
+
+class MacroCache:
+    """
+    Process-wide cache of the latest macro indicators. Reads are served from memory;
+    stale series are refreshed concurrently in a background thread and the result is
+    snapshotted to disk so a cold start does not need to hit FRED.
+    """
+
+    def __init__(self, snapshot_path: str = SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        self._values = {}       # name -> latest value
+        self._fetched_at = {}   # name -> unix time of the last successful fetch
+        self._lock = threading.Lock()
+        self._cold_lock = threading.Lock()
+        self._refreshing = False
+        self._last_cold_attempt = 0
+        self._load_snapshot()
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            self._values = {name: entry['value'] for name, entry in snapshot.items() if name in SERIES}
+            self._fetched_at = {name: entry['fetched_at'] for name, entry in snapshot.items() if name in SERIES}
+            print(f"Loaded macro snapshot from '{self.snapshot_path}'.")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ignoring unreadable macro snapshot: {e}")
+
+    def _save_snapshot(self):
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+            with self._lock:
+                snapshot = {name: {'value': value, 'fetched_at': self._fetched_at[name]} for name, value in self._values.items()}
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Failed to write macro snapshot: {e}")
+
+    def stale_series(self) -> list:
+        now = time.time()
+        return [name for name, (_, ttl, _) in SERIES.items() if now - self._fetched_at.get(name, 0) > ttl]
+
+    def refresh(self, names: list = None) -> bool:
+        """Fetches the given (default: stale) series concurrently. Returns True if any succeeded."""
+        names = self.stale_series() if names is None else names
+        if not names:
+            return True
+        fred = _get_client()
+        if fred is None:
+            return False
+
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            futures = {name: executor.submit(_fetch_series, fred, SERIES[name][0], SERIES[name][2]) for name in names}
+
+        fetched = {}
+        for name, future in futures.items():
+            try:
+                fetched[name] = future.result()
+            except Exception as e:
+                print(f"Failed to fetch FRED series {name}: {e}")
+        if not fetched:
+            return False
+
+        now = time.time()
+        with self._lock:
+            self._values.update(fetched)
+            self._fetched_at.update({name: now for name in fetched})
+        self._save_snapshot()
+        print(f"Successfully refreshed macroeconomic data from FRED: {sorted(fetched)}")
+        return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="macro-refresh", daemon=True).start()
+
+    def peek(self) -> dict:
+        """Returns whatever is cached right now, never touching FRED."""
+        with self._lock:
+            if not self._values:
+                return None
+            return {name: self._values[name] for name in SERIES if name in self._values}
+
+    def get(self) -> dict:
+        """Returns the cached indicators, refreshing stale series in the background."""
+        if len(self._values) < len(SERIES) and time.time() - self._last_cold_attempt > COLD_RETRY_SECONDS:
+            # Cold cache with no usable snapshot: the caller has nothing to fall back on,
+            # so fetch now (once, even if several requests arrive together)
+            with self._cold_lock:
+                missing = [name for name in SERIES if name not in self._values]
+                if missing:
+                    self._last_cold_attempt = time.time()
+                    self.refresh(missing)
+        elif self._values and self.stale_series():
+            self._refresh_in_background()
+
+        return self.peek()
+
+
+macro_cache = MacroCache()
+
+
 def fetch_macro_data():
     """
-    Fetches key macroeconomic indicators from the FRED API.
-    """
-    api_key = os.getenv("FRED_API_KEY")
-    if not api_key:
-        print("Error: FRED_API_KEY not found in .env file.")
-        return None
-
-    fred = Fred(api_key=api_key)
-    
-    # Define the series IDs for key economic indicators
-    series_ids = {
-        'GDP': 'GDP',                             # Gross Domestic Product
-        'CPI': 'CPIAUCSL',                        # Consumer Price Index (Inflation)
-        'FEDFUNDS': 'FEDFUNDS',                   # Federal Funds Effective Rate
-        'UNRATE': 'UNRATE',                       # Unemployment Rate
-        'BAMLH0A0HYM2': 'BAMLH0A0HYM2'             # High-Yield Index Spread (Credit Risk)
-    }
-    
-    try:
-        # Fetch the most recent value for each series
-        macro_data = {}
-        for name, series_id in series_ids.items():
-            data = fred.get_series_latest_release(series_id)
-            macro_data[name] = data.iloc[-1] # Get the most recent value
-            
-        print("Successfully fetched macroeconomic data from FRED.")
-        return macro_data
-        
-    except Exception as e:
-        print(f"Failed to fetch FRED data: {e}")
-        return None
+    Returns the latest key macroeconomic indicators from the shared FRED cache.
+    """
+    return macro_cache.get()
+
+def _as_released(releases: pd.DataFrame) -> pd.Series:
+    """
+    Turns ALFRED vintages (date, realtime_start, value) into the value a reader saw at each
+    release time: the newest observation published by then, in its latest revision by then.
+    """
+    releases = releases.astype({'date': 'datetime64[ns]', 'realtime_start': 'datetime64[ns]', 'value': 'float64'})
+    releases = releases.dropna().sort_values('realtime_start')
+    newest = releases.groupby('realtime_start')['date'].max().cummax().reset_index()
+    known = pd.merge_asof(newest, releases, on='realtime_start', by='date', direction='backward')
+    return known.dropna().set_index('realtime_start')['value']
+
+
+def fetch_macro_history(start) -> pd.DataFrame:
+    """
+    Returns the indicators as they were known at each point since `start`, one column per
+    indicator, indexed by release date (for point-in-time joins when building training data).
+    Release dates come from ALFRED vintages; for a series without them, observations are
+    shifted by the indicator's usual publication lag instead. Returns an empty DataFrame if
+    FRED is unavailable.
+    """
+    fred = _get_client()
+    if fred is None:
+        return pd.DataFrame()
+    # Start a lookback earlier so the first dates already have a previous observation
+    columns = {}
+    for name, (series_id, _, lookback_days) in SERIES.items():
+        realtime_start = (pd.Timestamp(start) - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+        try:
+            acquire('fred', WAIT_TIMEOUTS['fred'])
+            columns[name] = _as_released(fred.get_series_all_releases(series_id, realtime_start=realtime_start))
+        except Exception as e:
+            print(f"No vintages for FRED series {name} ({e}); shifting observations by {RELEASE_LAG_DAYS[name]} days.")
+            try:
+                acquire('fred', WAIT_TIMEOUTS['fred'])
+                observed = fred.get_series(series_id, observation_start=realtime_start).dropna()
+            except Exception as e:
+                print(f"Failed to fetch FRED history for {name}: {e}")
+                return pd.DataFrame()
+            columns[name] = observed.set_axis(observed.index + timedelta(days=RELEASE_LAG_DAYS[name]))
+    # Forward-fill so each row holds every indicator's latest released value
+    return pd.DataFrame(columns).sort_index().ffill()
 
 # For direct testing
 if __name__ == '__main__':
     data = fetch_macro_data()
     if data:
         print("\nLatest Macroeconomic Data:")
-        print(pd.Series(data))
\ No newline at end of file
+        print(pd.Series(data))
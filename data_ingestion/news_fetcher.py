@@ -4,52 +4,56 @@ import os
 import pandas as pd
 from newsapi import NewsApiClient
 from dotenv import load_dotenv
+from data_ingestion.rate_limiter import acquire, WAIT_TIMEOUTS
+from data_ingestion.news_store import news_store, FETCH_PAGE_SIZE, WINDOW_ARTICLES
+from common.metrics import span
 
 # Load environment variables from .env file
 load_dotenv()
 
-def fetch_news_headlines(query: str, language='en', page_size=20):
+def fetch_news_headlines(query: str, language='en', page_size=WINDOW_ARTICLES):
     """
-    Fetches news headlines for a given query using the NewsAPI.
+    Returns the latest news headlines for a given query. Articles are kept in the local
+    news store (see news_store.py); NewsAPI is only asked for articles newer than the
+    stored ones, and at most once per NEWS_REFRESH_SECONDS.
 
     Args:
         query (str): The search term (e.g., "Apple Inc", "Reliance Industries").
         language (str): The language of the articles (e.g., 'en').
-        page_size (int): The number of results to return per page.
+        page_size (int): The number of articles to return.
 
     Returns:
-        pandas.DataFrame: A DataFrame containing news articles,
-                          or an empty DataFrame if fetching fails.
+        pandas.DataFrame: The newest articles within NEWS_WINDOW_DAYS, newest first, with
+                          their sentiment and event flags, or an empty DataFrame if none.
     """
     api_key = os.getenv("NEWS_API_KEY")
     if not api_key:
-        print("Error: NEWS_API_KEY not found. Please set it in your .env file.")
-        return pd.DataFrame()
+        print("Error: NEWS_API_KEY not found. Please set it in your .env file. Serving stored articles.")
+    else:
+        newsapi = NewsApiClient(api_key=api_key)
 
-    newsapi = NewsApiClient(api_key=api_key)
-    print(f"Fetching news for query: '{query}'...")
+        def fetch_page(since):
+            print(f"Fetching news for query: '{query}'" + (f" since {since}..." if since else "..."))
+            acquire('news', WAIT_TIMEOUTS['news'])
+            with span("newsapi"):
+                response = newsapi.get_everything(q=query,
+                                                  language=language,
+                                                  sort_by='publishedAt', # Get the most recent articles
+                                                  page_size=FETCH_PAGE_SIZE,
+                                                  **({'from_param': since} if since else {}))
+            if response['status'] != 'ok':
+                raise RuntimeError(response.get('message'))
+            return response['articles']
 
-    try:
-        # Fetch the latest articles related to the query
-        response = newsapi.get_everything(q=query,
-                                          language=language,
-                                          sort_by='publishedAt', # Get the most recent articles
-                                          page_size=page_size)
+        try:
+            new_articles = news_store.refresh(query, fetch_page)
+            if new_articles:
+                print(f"Successfully fetched {new_articles} new articles.")
+        except Exception as e:
+            print(f"An error occurred: {e}. Serving stored articles.")
 
-        if response['status'] == 'ok':
-            articles = response['articles']
-            # Convert the list of articles to a DataFrame
-            df = pd.DataFrame(articles)
-            print(f"Successfully fetched {len(articles)} articles.")
-            # Select and reorder important columns
-            return df[['publishedAt', 'title', 'description', 'source', 'url']]
-        else:
-            print(f"Error fetching news: {response.get('message')}")
-            return pd.DataFrame()
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return pd.DataFrame()
+    news = news_store.window(query, limit=page_size)
+    return news if not news.empty else pd.DataFrame()
 
 # This block allows you to test the function directly
 if __name__ == '__main__':
@@ -0,0 +1,210 @@
+# In: data_ingestion/news_store.py
+
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from common.sentiment import score_headline
+
+STORE_PATH = os.getenv("NEWS_STORE_PATH", os.path.join(".cache", "news.db"))
+
+# A query is sent to NewsAPI at most this often; in between it is served from the store
+REFRESH_SECONDS = float(os.getenv("NEWS_REFRESH_SECONDS", 15 * 60))
+
+# Articles requested per NewsAPI call (100 is the API maximum; a call costs the same either way)
+FETCH_PAGE_SIZE = int(os.getenv("NEWS_FETCH_PAGE_SIZE", 100))
+
+# Scoring only looks at the newest WINDOW_ARTICLES published within WINDOW_DAYS
+WINDOW_DAYS = float(os.getenv("NEWS_WINDOW_DAYS", 30))
+WINDOW_ARTICLES = int(os.getenv("NEWS_WINDOW_ARTICLES", 20))
+
+# Columns fetch_news_headlines returns: NewsAPI's, plus the scores computed at insert time
+COLUMNS = ['publishedAt', 'title', 'description', 'source', 'url', 'sentiment', 'positive_event', 'negative_event']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY,
+    published_at TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    source_id TEXT,
+    source_name TEXT,
+    sentiment REAL NOT NULL,
+    positive_event INTEGER NOT NULL,
+    negative_event INTEGER NOT NULL,
+    inserted_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS query_articles (
+    query TEXT NOT NULL,
+    url TEXT NOT NULL REFERENCES articles (url),
+    published_at TEXT NOT NULL,
+    PRIMARY KEY (query, url)
+);
+CREATE INDEX IF NOT EXISTS idx_query_articles_published ON query_articles (query, published_at);
+CREATE TABLE IF NOT EXISTS queries (
+    query TEXT PRIMARY KEY,
+    newest_published_at TEXT,
+    last_fetched_at REAL NOT NULL
+);
+"""
+
+
+def _utc_iso(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class NewsStore:
+    """
+    Local SQLite store of NewsAPI articles, keyed by URL. Each query remembers the newest
+    publishedAt it has seen, so a refresh only asks NewsAPI for articles after it, and at
+    most once per REFRESH_SECONDS. Sentiment and event flags are computed once, when an
+    article is first inserted.
+    """
+
+    def __init__(self, path: str = STORE_PATH, refresh_seconds: float = REFRESH_SECONDS):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._local = threading.local()
+        self._refreshing = {}   # query -> Event set when its in-progress refresh finishes
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self.api_calls = self.skipped_refreshes = self.inserted = self.duplicates = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run while a refresh writes."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+        return conn
+
+    def query_state(self, query: str):
+        """Returns (newest_published_at, last_fetched_at) for a query, or None if never fetched."""
+        return self._connection().execute(
+            "SELECT newest_published_at, last_fetched_at FROM queries WHERE query = ?", (query,)
+        ).fetchone()
+
+    def add(self, query: str, articles: list, fetched_at: float = None) -> int:
+        """
+        Stores NewsAPI article dicts for a query, scoring only URLs not seen before.
+        Returns the number of new articles.
+        """
+        conn = self._connection()
+        urls = [article['url'] for article in articles if article.get('url') and article.get('title')]
+        known = set()
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            known.update(row[0] for row in conn.execute(
+                f"SELECT url FROM articles WHERE url IN ({','.join('?' * len(chunk))})", chunk))
+
+        inserted_at = _utc_iso(datetime.now(timezone.utc))
+        new_rows, links, seen = [], [], set()
+        for article in articles:
+            url = article.get('url')
+            if not url or not article.get('title') or url in seen:
+                continue
+            seen.add(url)
+            links.append((query, url, article['publishedAt']))
+            if url in known:
+                continue
+            scores = score_headline(article['title'])
+            source = article.get('source') or {}
+            new_rows.append((
+                url, article['publishedAt'], article['title'], article.get('description'),
+                source.get('id'), source.get('name'),
+                scores['sentiment'], int(scores['positive_event']), int(scores['negative_event']), inserted_at,
+            ))
+
+        newest = max((link[2] for link in links), default=None)
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", new_rows)
+            conn.executemany("INSERT OR IGNORE INTO query_articles VALUES (?, ?, ?)", links)
+            conn.execute("""
+                INSERT INTO queries (query, newest_published_at, last_fetched_at) VALUES (?, ?, ?)
+                ON CONFLICT (query) DO UPDATE SET
+                    newest_published_at = MAX(COALESCE(newest_published_at, ''), COALESCE(excluded.newest_published_at, '')),
+                    last_fetched_at = excluded.last_fetched_at
+            """, (query, newest, fetched_at if fetched_at is not None else time.time()))
+        self.inserted += len(new_rows)
+        self.duplicates += len(links) - len(new_rows)
+        return len(new_rows)
+
+    def refresh(self, query: str, fetch_page, force: bool = False) -> int:
+        """
+        Brings a query up to date with fetch_page(since) -> list of NewsAPI article dicts
+        (since is the newest publishedAt already stored, or None). Skipped while the last
+        fetch is recent; concurrent refreshes of the same query wait for the first one.
+        Returns the number of new articles.
+        """
+        with self._lock:
+            event = self._refreshing.get(query)
+            if event is None:
+                self._refreshing[query] = threading.Event()
+        if event is not None:
+            event.wait()
+            return 0
+
+        try:
+            state = self.query_state(query)
+            if not force and state is not None and time.time() - state[1] < self.refresh_seconds:
+                self.skipped_refreshes += 1
+                return 0
+            fetched_at = time.time()
+            self.api_calls += 1
+            articles = fetch_page((state[0] or None) if state else None)
+            return self.add(query, articles, fetched_at)
+        finally:
+            with self._lock:
+                self._refreshing.pop(query).set()
+
+    def articles(self, query: str, since: datetime = None, until: datetime = None, limit: int = None) -> pd.DataFrame:
+        """Stored articles for a query, newest first, in the layout fetch_news_headlines returns."""
+        sql = """
+            SELECT a.published_at, a.title, a.description, a.source_id, a.source_name, a.url,
+                   a.sentiment, a.positive_event, a.negative_event
+            FROM query_articles q JOIN articles a ON a.url = q.url
+            WHERE q.query = ?
+        """
+        params = [query]
+        if since is not None:
+            sql += " AND q.published_at >= ?"
+            params.append(_utc_iso(since))
+        if until is not None:
+            sql += " AND q.published_at < ?"
+            params.append(_utc_iso(until))
+        sql += " ORDER BY q.published_at DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = self._connection().execute(sql, params).fetchall()
+        if not rows:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.DataFrame([
+            {
+                'publishedAt': published_at, 'title': title, 'description': description,
+                'source': {'id': source_id, 'name': source_name}, 'url': url,
+                'sentiment': sentiment, 'positive_event': bool(positive), 'negative_event': bool(negative),
+            }
+            for published_at, title, description, source_id, source_name, url, sentiment, positive, negative in rows
+        ], columns=COLUMNS)
+
+    def window(self, query: str, days: float = WINDOW_DAYS, limit: int = None) -> pd.DataFrame:
+        """The newest stored articles published within the last `days` days."""
+        return self.articles(query, since=datetime.now(timezone.utc) - timedelta(days=days), limit=limit)
+
+    def stats(self) -> dict:
+        return {
+            "api_calls": self.api_calls,
+            "skipped_refreshes": self.skipped_refreshes,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+        }
+
+
+news_store = NewsStore()
@@ -0,0 +1,301 @@
+# In: data_ingestion/price_store.py
+
+import os
+import json
+import time
+import uuid
+import threading
+import numpy as np
+import pandas as pd
+from data_ingestion.download_batcher import yahoo_batcher
+
+# Columns are stored field-major (one contiguous row per field) so each field can be
+# handed to pandas/NumPy as a zero-copy view of the memory-mapped file. Each ticker is one
+# file of 64-bit words: row 0 holds the dates (datetime64[D]), the rest the float64 fields,
+# so a single rename swaps dates and bars together.
+FIELDS = ['Close', 'High', 'Low', 'Open', 'Volume']
+
+STORE_DIR = os.getenv("PRICE_STORE_PATH", os.path.join(".cache", "prices"))
+
+# How long a ticker is considered up to date after a successful check against Yahoo
+REFRESH_SECONDS = 15 * 60
+
+# Backfills for period='max' start here
+EARLIEST_START = pd.Timestamp("1970-01-01")
+
+# Bars are split/dividend adjusted: if Yahoo's Close for an already stored bar differs by more
+# than this (relative), the history was rescaled and is downloaded again in full
+ADJUSTMENT_TOLERANCE = float(os.getenv("PRICE_ADJUSTMENT_TOLERANCE", 1e-4))
+
+
+def period_start(period: str, end: pd.Timestamp) -> pd.Timestamp:
+    """Converts a yfinance-style period ('5d', '3mo', '1y', 'max') into a start date."""
+    if period == 'max':
+        return pd.Timestamp.min
+    if period == 'ytd':
+        return pd.Timestamp(year=end.year, month=1, day=1)
+    units = {'d': 'days', 'wk': 'weeks', 'mo': 'months', 'y': 'years'}
+    for suffix, unit in units.items():
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return end - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"Unsupported period: {period}")
+
+
+class PriceStore:
+    """
+    Local per-ticker store of daily OHLCV bars, kept as memory-mapped NumPy arrays.
+    Only bars newer than the last stored one are requested from Yahoo Finance, plus any
+    older range a longer `period` asks for that has not been requested before.
+    """
+
+    def __init__(self, path: str = STORE_DIR):
+        self.path = path
+        self._last_checked = {}   # ticker -> unix time of the last upstream check
+        self._updating = {}       # ticker -> Event set once its in-progress update finishes
+        self._lock = threading.Lock()
+        self._coverage = None     # ticker -> earliest start date already requested from Yahoo
+
+    def _file(self, ticker: str) -> str:
+        return os.path.join(self.path, f"{ticker.upper()}.bars.npy")
+
+    def read(self, ticker: str):
+        """
+        Returns (dates, ohlcv) for a ticker without copying: dates is datetime64[D] of
+        shape (n,), ohlcv is float64 of shape (len(FIELDS), n). Returns None if not stored.
+        """
+        try:
+            bars = np.load(self._file(ticker), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        return bars[0].view('datetime64[D]'), bars[1:].view('float64')
+
+    def last_date(self, ticker: str):
+        stored = self.read(ticker)
+        if stored is None or len(stored[0]) == 0:
+            return None
+        return pd.Timestamp(stored[0][-1])
+
+    def _write(self, ticker: str, dates: np.ndarray, ohlcv: np.ndarray):
+        # Write a temp file unique to this writer and swap it in with one rename, so readers
+        # see either the old or the new bars, and open memory maps keep the old version
+        os.makedirs(self.path, exist_ok=True)
+        bars = np.empty((1 + len(FIELDS), len(dates)), dtype='int64')
+        bars[0] = np.asarray(dates, dtype='datetime64[D]').view('int64')
+        bars[1:] = np.asarray(ohlcv, dtype='float64').view('int64')
+        target = self._file(ticker)
+        tmp_path = f"{target}.{os.getpid()}.{uuid.uuid4().hex}.tmp.npy"
+        try:
+            np.save(tmp_path, bars)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _arrays(bars: pd.DataFrame) -> tuple:
+        """(dates, ohlcv) in the stored layout from a downloaded frame."""
+        dates = pd.to_datetime(bars.index).tz_localize(None).values.astype('datetime64[D]')
+        return dates, bars.reindex(columns=FIELDS).to_numpy(dtype='float64').T
+
+    def _merge(self, ticker: str, new_bars: pd.DataFrame):
+        """
+        Replaces stored bars from the first new date onwards with the downloaded ones, or
+        prepends them when they all predate the stored history (a backfill).
+        """
+        new_bars = new_bars.dropna(how='all')
+        if new_bars.empty:
+            return
+        new_dates, new_ohlcv = self._arrays(new_bars)
+
+        stored = self.read(ticker)
+        if stored is not None and len(stored[0]) and new_dates[-1] < stored[0][0]:
+            new_dates = np.concatenate([new_dates, stored[0]])
+            new_ohlcv = np.concatenate([new_ohlcv, stored[1]], axis=1)
+        elif stored is not None:
+            keep = stored[0] < new_dates[0]
+            new_dates = np.concatenate([stored[0][keep], new_dates])
+            new_ohlcv = np.concatenate([stored[1][:, keep], new_ohlcv], axis=1)
+        self._write(ticker, new_dates, new_ohlcv)
+
+    def _coverage_file(self) -> str:
+        return os.path.join(self.path, "coverage.json")
+
+    def _load_coverage(self) -> dict:
+        if self._coverage is None:
+            try:
+                with open(self._coverage_file()) as f:
+                    self._coverage = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._coverage = {}
+        return self._coverage
+
+    def covered_from(self, ticker: str):
+        """The earliest start date already requested for a ticker, or None."""
+        covered = self._load_coverage().get(ticker.upper())
+        return pd.Timestamp(covered) if covered else None
+
+    def _set_covered_from(self, tickers: list, start: pd.Timestamp):
+        with self._lock:
+            self._load_coverage()
+            for ticker in tickers:
+                current = self.covered_from(ticker)
+                if current is None or start < current:
+                    self._coverage[ticker.upper()] = start.strftime('%Y-%m-%d')
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = f"{self._coverage_file()}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._coverage, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self._coverage_file())
+
+    def _backfill_start(self, ticker: str, period: str):
+        """
+        The start of the older range `period` asks for that is neither stored nor was
+        requested before (Yahoo has nothing before a listing date), or None.
+        """
+        stored = self.read(ticker)
+        if stored is None or len(stored[0]) == 0:
+            return None
+        first = pd.Timestamp(stored[0][0])
+        start = max(period_start(period, pd.Timestamp.now().normalize()), EARLIEST_START)
+        covered = self.covered_from(ticker)
+        if start >= first or (covered is not None and start >= covered):
+            return None
+        return start
+
+    def update(self, tickers: list, period: str = "1y"):
+        """
+        Brings the given tickers up to date. Tickers with no history are backfilled for
+        `period`; the rest only fetch from their last complete stored bar (the latest may
+        have been a partial intraday bar), plus the older bars a longer `period` needs that
+        have not been requested before. If that complete bar's Close changed, a split or
+        dividend rescaled the adjusted history, and the ticker is downloaded again in full. Downloads go through the shared batcher,
+        so concurrent updates share multi-symbol requests; a ticker another thread is
+        already updating is waited for rather than fetched twice.
+        """
+        now = time.time()
+        with self._lock:
+            upper = list(dict.fromkeys(t.upper() for t in tickers))
+            waiting = [self._updating[t] for t in upper if t in self._updating]
+            due = [t for t in upper if t not in self._updating and now - self._last_checked.get(t, 0) > REFRESH_SECONDS]
+            for ticker in due:
+                self._last_checked[ticker] = now
+                self._updating[ticker] = threading.Event()
+
+        try:
+            # Older missing ranges first, so the prepend never races a newer merge
+            backfills = {}
+            for ticker in due:
+                start = self._backfill_start(ticker, period)
+                if start is not None:
+                    end = pd.Timestamp(self.read(ticker)[0][0])
+                    backfills.setdefault((start, end), []).append(ticker)
+            for (start, end), group in backfills.items():
+                try:
+                    print(f"Backfilling price history from {start.date()} to {end.date()} for {group}...")
+                    bars_by_ticker = yahoo_batcher.fetch(group, start=start.strftime('%Y-%m-%d'),
+                                                         end=end.strftime('%Y-%m-%d'), interval="1d")
+                except Exception as e:
+                    print(f"Price store backfill failed for {group}: {e}. Serving stored history.")
+                    continue
+                for ticker, bars in bars_by_ticker.items():
+                    if bars is not None:
+                        with self._lock:
+                            self._merge(ticker, bars[pd.to_datetime(bars.index).tz_localize(None) < end])
+                self._set_covered_from(group, start)
+
+            groups = {}
+            for ticker in due:
+                stored = self.read(ticker)
+                # From the last complete bar: it is compared with the stored one to catch a
+                # re-adjusted history, and the last bar may have been a partial intraday one
+                anchor = None if stored is None or len(stored[0]) == 0 else pd.Timestamp(stored[0][max(len(stored[0]) - 2, 0)])
+                groups.setdefault(anchor, []).append(ticker)
+
+            rescaled = []
+            for anchor, group in groups.items():
+                try:
+                    if anchor is None:
+                        print(f"Backfilling {period} of price history for {group}...")
+                        bars_by_ticker = yahoo_batcher.fetch(group, period=period, interval="1d")
+                    else:
+                        print(f"Fetching price bars since {anchor.date()} for {group}...")
+                        bars_by_ticker = yahoo_batcher.fetch(group, start=anchor.strftime('%Y-%m-%d'), interval="1d")
+                except Exception as e:
+                    print(f"Price store update failed for {group}: {e}. Serving stored history.")
+                    continue
+                for ticker, bars in bars_by_ticker.items():
+                    if bars is None:
+                        continue
+                    if anchor is not None and self._rescaled(ticker, anchor, bars):
+                        rescaled.append(ticker)
+                        continue
+                    with self._lock:
+                        self._merge(ticker, bars)
+                if anchor is None:
+                    self._set_covered_from(group, max(period_start(period, pd.Timestamp.now().normalize()), EARLIEST_START))
+
+            if rescaled:
+                self._redownload(rescaled)
+        finally:
+            with self._lock:
+                for ticker in due:
+                    self._updating.pop(ticker).set()
+
+        for event in waiting:
+            event.wait()
+
+    def _rescaled(self, ticker: str, anchor: pd.Timestamp, bars: pd.DataFrame) -> bool:
+        """Whether the downloaded Close for the stored `anchor` bar no longer matches the stored one."""
+        stored = self.read(ticker)
+        dates, ohlcv = self._arrays(bars)
+        day = np.datetime64(anchor.date(), 'D')
+        if stored is None or day not in dates:
+            return False
+        old = stored[1][FIELDS.index('Close')][int(np.searchsorted(stored[0], day))]
+        new = ohlcv[FIELDS.index('Close')][int(np.searchsorted(dates, day))]
+        if old != old or new != new:
+            return False
+        return abs(new - old) > ADJUSTMENT_TOLERANCE * abs(old)
+
+    def _redownload(self, tickers: list):
+        """Replaces the whole stored history of tickers whose adjusted prices were rescaled."""
+        starts = {}
+        for ticker in tickers:
+            start = self.covered_from(ticker) or pd.Timestamp(self.read(ticker)[0][0])
+            starts.setdefault(start, []).append(ticker)
+        for start, group in starts.items():
+            print(f"⚠️ Adjusted prices changed for {group} (split or dividend); re-downloading since {start.date()}...")
+            try:
+                bars_by_ticker = yahoo_batcher.fetch(group, start=start.strftime('%Y-%m-%d'), interval="1d")
+            except Exception as e:
+                print(f"Price store re-download failed for {group}: {e}. Serving stored history.")
+                with self._lock:
+                    for ticker in group:
+                        self._last_checked.pop(ticker, None)   # retried on the next update
+                continue
+            for ticker, bars in bars_by_ticker.items():
+                bars = bars.dropna(how='all') if bars is not None else None
+                if bars is None or bars.empty:
+                    continue
+                with self._lock:
+                    self._write(ticker, *self._arrays(bars))
+
+    def frame(self, ticker: str, period: str = "1y") -> pd.DataFrame:
+        """
+        Returns stored bars for one ticker in the yfinance layout (MultiIndex columns of
+        (Price, Ticker)). The data is a view of the memory-mapped file, not a copy.
+        """
+        stored = self.read(ticker)
+        if stored is None or len(stored[0]) == 0:
+            return pd.DataFrame()
+        dates, ohlcv = stored
+        end = pd.Timestamp(dates[-1])
+        start = np.datetime64(max(period_start(period, end), pd.Timestamp(dates[0])).date(), 'D')
+        first = int(np.searchsorted(dates, start))
+
+        columns = pd.MultiIndex.from_product([FIELDS, [ticker.upper()]], names=['Price', 'Ticker'])
+        index = pd.DatetimeIndex(dates[first:], name='Date')
+        return pd.DataFrame(ohlcv[:, first:].T, index=index, columns=columns, copy=False)
+
+
+price_store = PriceStore()
@@ -0,0 +1,93 @@
+# In: data_ingestion/rate_limiter.py
+
+import os
+import time
+import threading
+from dotenv import load_dotenv
+from common.metrics import span
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Upstream request quotas, per source. Every call that reaches Yahoo Finance, NewsAPI or
+# FRED takes a token first, so throughput is bounded by these rather than by sleeps.
+RATE_LIMITS = {
+    # source: (requests per minute, burst size)
+    'yahoo': (float(os.getenv("YAHOO_RATE_PER_MINUTE", 60)), int(os.getenv("YAHOO_BURST", 10))),
+    'news': (float(os.getenv("NEWS_RATE_PER_MINUTE", 30)), int(os.getenv("NEWS_BURST", 5))),
+    'fred': (float(os.getenv("FRED_RATE_PER_MINUTE", 120)), int(os.getenv("FRED_BURST", 10))),
+}
+
+# Longest a fetch waits for a token: the API gives up on a source after the same timeout,
+# so a thread still queued past it would only keep a to_thread worker busy for nothing
+WAIT_TIMEOUTS = {
+    'yahoo': float(os.getenv("MARKET_TIMEOUT", 10)),
+    'news': float(os.getenv("NEWS_TIMEOUT", 8)),
+    'fred': float(os.getenv("MACRO_TIMEOUT", 5)),
+}
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when no token for a source becomes available within the caller's timeout."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waits = 0   # number of acquires that had to wait for a token
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Takes one token, waiting for it if needed. Returns False if `timeout` runs out first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    if waited:
+                        self.waits += 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            waited = True
+            time.sleep(wait)
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+rate_limiters = {source: TokenBucket(per_minute / 60, burst) for source, (per_minute, burst) in RATE_LIMITS.items()}
+
+
+def acquire(source: str, timeout: float = None):
+    """
+    Takes a token for an upstream request to `source` ('yahoo', 'news' or 'fred').
+    Raises RateLimitTimeout if none is available within `timeout` seconds.
+    """
+    with span(f"rate_limit_{source}"):
+        if not rate_limiters[source].acquire(timeout):
+            raise RateLimitTimeout(f"No {source} request token within {timeout}s")
+
+
+def limiter_stats() -> dict:
+    return {
+        source: {"tokens": round(bucket.available, 2), "per_minute": bucket.rate * 60, "waits": bucket.waits}
+        for source, bucket in rate_limiters.items()
+    }
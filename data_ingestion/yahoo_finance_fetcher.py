@@ -2,6 +2,8 @@
 
 import yfinance as yf
 import pandas as pd
+from data_ingestion.price_store import price_store
+from data_ingestion.rate_limiter import acquire, WAIT_TIMEOUTS
 
 def fetch_ticker_data(tickers: list, period="1y", interval="1d"):
     """
@@ -18,6 +20,7 @@ def fetch_ticker_data(tickers: list, period="1y", interval="1d"):
     """
     print(f"Fetching data for tickers: {tickers}...")
     try:
+        acquire('yahoo', WAIT_TIMEOUTS['yahoo'])
         data = yf.download(tickers, period=period, interval=interval)
         if data.empty:
             print(f"Warning: No data found for tickers {tickers}. Check if symbols are correct.")
@@ -29,6 +32,30 @@ def fetch_ticker_data(tickers: list, period="1y", interval="1d"):
         print(f"An error occurred: {e}")
         return pd.DataFrame()
 
+def load_ticker_data(tickers: list, period="1y"):
+    """
+    Returns daily OHLCV data for a list of tickers from the local price store,
+    fetching only the bars missing since the last stored one.
+
+    Args:
+        tickers (list): A list of stock ticker symbols (e.g., ['AAPL', 'MSFT']).
+        period (str): The period of data to return (e.g., "1y", "5d", "max").
+
+    Returns:
+        pandas.DataFrame: The same layout as fetch_ticker_data, or an empty
+                          DataFrame if no history is available.
+    """
+    price_store.update(tickers, period=period)
+    frames = [price_store.frame(ticker, period=period) for ticker in tickers]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        print(f"Warning: No stored or fetched data for tickers {tickers}.")
+        return pd.DataFrame()
+    if len(frames) == 1:
+        # Single ticker: a zero-copy view of the stored arrays
+        return frames[0]
+    return pd.concat(frames, axis=1)
+
 # This block allows you to test the function directly by running this file
 if __name__ == '__main__':
     # Example tickers: Apple, Microsoft, and Reliance Industries (NSE)
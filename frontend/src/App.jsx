@@ -78,7 +78,7 @@ function App() {
     try {
       // --- THIS IS THE FIX ---
       // Added the missing '/data/' to the URL path
-      const dataResponse = await axios.get(`${backendUrl}/data/${primaryTicker}`);
+      const dataResponse = await axios.get(`${backendUrl}/data/${primaryTicker}?fields=score,features,news,macro`);
       // -----------------------
       
       setData(dataResponse.data);
@@ -2,32 +2,26 @@
 
 import os
 import sys
-import pandas as pd
-import psycopg2
-import json
 import time
+import json
 from dotenv import load_dotenv
 
 # Add the project root to the Python path to allow imports
 sys.path.append('.')
-from data_ingestion.yahoo_finance_fetcher import fetch_ticker_data
+from data_ingestion.price_store import price_store
 from data_ingestion.news_fetcher import fetch_news_headlines
 from data_ingestion.fred_fetcher import fetch_macro_data
+from backend.db import enqueue_score, score_writer
 from backend.scoring_engine import engineer_features, calculate_credit_score
+from backend.feature_state import feature_states
+from backend.score_history import score_history
+from backend.pubsub import publish_score
+from backend.scheduler import RefreshScheduler, load_universe, last_scored_times
+from common.metrics import span, stage_seconds, serve_metrics
 
 # Load environment variables from .env file
 load_dotenv()
 
-def get_db_connection():
-    """Establishes a robust database connection using individual .env variables."""
-    conn = psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        dbname=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD")
-    )
-    return conn
-
 def generate_live_data_point(ticker: str):
     """
     Fetches the latest data for a single ticker, calculates a score using the ML model,
@@ -36,42 +30,44 @@ def generate_live_data_point(ticker: str):
     try:
         print(f"\n--- Processing live data for ticker: {ticker} ---")
         
-        # 1. Fetch live data
-        market_data = fetch_ticker_data([ticker], period="1y")
-        news_data = fetch_news_headlines(query=f"{ticker} company")
-        macro_data = fetch_macro_data()
+        # 1. Fetch live data: only bars newer than the stored ones are downloaded
+        with span("fetch_market"):
+            price_store.update([ticker], period="1y")
+        with span("fetch_news"):
+            news_data = fetch_news_headlines(query=f"{ticker} company")
+        with span("fetch_macro"):
+            macro_data = fetch_macro_data()
+
+        # 2. Apply the new bars to the ticker's rolling feature state
+        with span("feature_state"):
+            feature_state = feature_states.sync_stored(ticker)
 
-        if market_data.empty or news_data.empty or not macro_data:
+        if feature_state is None or news_data.empty or not macro_data:
             print(f"Skipping {ticker} due to missing live data.")
             return False
 
-        # 2. Pre-process data
-        if isinstance(market_data.columns, pd.MultiIndex):
-            market_data.columns = ['_'.join(col).strip() for col in market_data.columns.values]
-        market_data_json = market_data.reset_index().to_dict(orient='records')
+        # 3. Engineer features for the ML model (price features come from the state)
         news_data_json = news_data.to_dict(orient='records')
-
-        # 3. Engineer features for the ML model
-        features_df = engineer_features(ticker, market_data_json, news_data_json, macro_data)
+        features_df = engineer_features(ticker, None, news_data_json, macro_data, feature_state=feature_state)
         
         # 4. Calculate score using the ML model
         credit_score_result = calculate_credit_score(features_df)
         
-        # 5. Save the new score to the database
-        conn = get_db_connection()
-        cur = conn.cursor()
-        insert_query = "INSERT INTO credit_scores (ticker, score, features, explanation) VALUES (%s, %s, %s, %s)"
-        score_data = (
-            ticker.upper(),
-            credit_score_result['score'],
-            json.dumps(features_df.to_dict(orient='records')[0]),
-            json.dumps(credit_score_result['explanation'])
-        )
-        cur.execute(insert_query, score_data)
-        conn.commit()
-        cur.close()
-        conn.close()
-        print(f"✅ Successfully saved new live score for {ticker}.")
+        # 5. Queue the new score for a batched database write
+        with span("db_enqueue"):
+            enqueue_score(ticker, credit_score_result['score'], features_df.to_dict(orient='records')[0], credit_score_result['explanation'],
+                          credit_score_result.get('model_version'))
+        print(f"✅ Successfully queued new live score for {ticker}.")
+
+        # 6. Push it to streaming clients (through Postgres NOTIFY, see backend/pubsub.py)
+        try:
+            with span("alert_query"):
+                previous_score = score_history.latest_score(ticker)
+        except Exception as e:
+            print(f"Could not look up the previous score for {ticker}: {e}")
+            previous_score = None
+        publish_score(ticker, credit_score_result['score'], previous_score, source="live_worker")
+        score_history.record(ticker, credit_score_result['score'])
         return True
 
     except Exception as e:
@@ -80,16 +76,23 @@ def generate_live_data_point(ticker: str):
 
 # --- Main Execution Loop ---
 if __name__ == "__main__":
-    target_tickers = ['AAPL', 'MSFT', 'GOOGL', 'TSLA', 'NVDA']
-    
-    # This loop will run forever to continuously update scores
-    while True:
-        print(f"\n--- Starting new scoring cycle at {time.ctime()} ---")
-        for ticker in target_tickers:
-            generate_live_data_point(ticker)
-            # Pause between tickers to respect API rate limits
-            time.sleep(15) 
-            
-        # Wait for 5 minutes before starting the next full cycle
-        print("\n--- Cycle complete. Waiting for 15 minutes... ---")
-        time.sleep(300)
\ No newline at end of file
+    universe = load_universe()
+    scheduler = RefreshScheduler(generate_live_data_point, universe, last_refreshed=last_scored_times())
+    print(f"Starting live scoring for {len(universe)} tickers with {scheduler.workers} workers...")
+    scheduler.start()
+    if os.getenv("LIVE_METRICS_PORT"):
+        serve_metrics(int(os.getenv("LIVE_METRICS_PORT")))
+
+    # Workers run until the process is stopped; report queue depth and reload the universe periodically
+    stats_seconds = float(os.getenv("LIVE_STATS_SECONDS", 60))
+    try:
+        while True:
+            time.sleep(stats_seconds)
+            print(f"Scheduler stats at {time.ctime()}: {json.dumps(scheduler.stats())}")
+            stage_ms = {stage: round(s["sum"] / s["count"] * 1000, 1) for stage, s in stage_seconds.snapshot().items() if s["count"]}
+            print(f"Mean stage times (ms): {json.dumps(stage_ms)}")
+            scheduler.set_universe(load_universe())
+    except KeyboardInterrupt:
+        print("Stopping live worker...")
+    finally:
+        score_writer.flush()
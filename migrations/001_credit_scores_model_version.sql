@@ -0,0 +1,4 @@
+-- In: migrations/001_credit_scores_model_version.sql
+-- Records which model version produced each score (see backend/model_registry.py).
+
+ALTER TABLE credit_scores ADD COLUMN IF NOT EXISTS model_version TEXT;
@@ -0,0 +1,155 @@
+-- In: migrations/002_score_timeseries.sql
+-- Typed, time-partitioned score storage with hourly and daily rollups (see backend/score_store.py).
+-- credit_scores keeps the JSON record of each score; score_points holds the same scores with
+-- one column per feature and contribution, partitioned by month.
+
+CREATE TABLE IF NOT EXISTS score_points (
+    score_id BIGINT,
+    ticker TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    score SMALLINT NOT NULL,
+    prediction DOUBLE PRECISION,
+    model_version TEXT,
+    close DOUBLE PRECISION,
+    high DOUBLE PRECISION,
+    low DOUBLE PRECISION,
+    open DOUBLE PRECISION,
+    volume DOUBLE PRECISION,
+    trend_indicator DOUBLE PRECISION,
+    sentiment DOUBLE PRECISION,
+    positive_events DOUBLE PRECISION,
+    negative_events DOUBLE PRECISION,
+    gdp DOUBLE PRECISION,
+    cpi DOUBLE PRECISION,
+    fedfunds DOUBLE PRECISION,
+    unrate DOUBLE PRECISION,
+    bamlh0a0hym2 DOUBLE PRECISION,
+    base_value DOUBLE PRECISION,
+    shap_close DOUBLE PRECISION,
+    shap_high DOUBLE PRECISION,
+    shap_low DOUBLE PRECISION,
+    shap_open DOUBLE PRECISION,
+    shap_volume DOUBLE PRECISION,
+    shap_trend_indicator DOUBLE PRECISION,
+    shap_sentiment DOUBLE PRECISION,
+    shap_positive_events DOUBLE PRECISION,
+    shap_negative_events DOUBLE PRECISION,
+    shap_gdp DOUBLE PRECISION,
+    shap_cpi DOUBLE PRECISION,
+    shap_fedfunds DOUBLE PRECISION,
+    shap_unrate DOUBLE PRECISION,
+    shap_bamlh0a0hym2 DOUBLE PRECISION
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX IF NOT EXISTS idx_score_points_ticker_time ON score_points (ticker, created_at);
+CREATE INDEX IF NOT EXISTS idx_score_points_score_id ON score_points (score_id);
+
+CREATE TABLE IF NOT EXISTS score_rollups_hourly (
+    ticker TEXT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    min_score SMALLINT NOT NULL,
+    max_score SMALLINT NOT NULL,
+    avg_score DOUBLE PRECISION NOT NULL,
+    last_score SMALLINT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (ticker, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS score_rollups_daily (LIKE score_rollups_hourly INCLUDING ALL);
+
+-- Raw-row retention and the legacy /history path both filter credit_scores by time
+CREATE INDEX IF NOT EXISTS idx_credit_scores_ticker_time ON credit_scores (ticker, created_at);
+CREATE INDEX IF NOT EXISTS idx_credit_scores_created_at ON credit_scores (created_at);
+
+-- Creates the monthly partition holding `day` (score_points_pYYYYMM) if it does not exist
+CREATE OR REPLACE FUNCTION ensure_score_partition(day TIMESTAMP) RETURNS VOID AS $$
+DECLARE
+    month_start TIMESTAMP := date_trunc('month', day);
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF score_points FOR VALUES FROM (%L) TO (%L)',
+        'score_points_p' || to_char(month_start, 'YYYYMM'), month_start, month_start + INTERVAL '1 month'
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drops the monthly partitions that end on or before `cutoff`; returns how many were dropped
+CREATE OR REPLACE FUNCTION drop_score_partitions_before(cutoff TIMESTAMP) RETURNS INTEGER AS $$
+DECLARE
+    partition_name TEXT;
+    dropped INTEGER := 0;
+BEGIN
+    FOR partition_name IN
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'score_points' AND child.relname ~ '^score_points_p[0-9]{6}$'
+    LOOP
+        IF to_timestamp(substring(partition_name FROM '[0-9]{6}$'), 'YYYYMM')::TIMESTAMP + INTERVAL '1 month' <= cutoff THEN
+            EXECUTE format('DROP TABLE %I', partition_name);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill: partitions for every month with scores, then typed rows from the JSON columns
+DO $$
+DECLARE
+    month TIMESTAMP;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', COALESCE(MIN(created_at), now())::TIMESTAMP),
+            date_trunc('month', now()::TIMESTAMP) + INTERVAL '1 month',
+            INTERVAL '1 month'
+        ) FROM credit_scores
+    LOOP
+        PERFORM ensure_score_partition(month);
+    END LOOP;
+END;
+$$;
+
+INSERT INTO score_points
+SELECT
+    id, ticker, created_at, score,
+    (e ->> 'prediction')::DOUBLE PRECISION,
+    model_version,
+    (f ->> 'Close')::DOUBLE PRECISION,
+    (f ->> 'High')::DOUBLE PRECISION,
+    (f ->> 'Low')::DOUBLE PRECISION,
+    (f ->> 'Open')::DOUBLE PRECISION,
+    (f ->> 'Volume')::DOUBLE PRECISION,
+    (f ->> 'trend_indicator')::DOUBLE PRECISION,
+    (f ->> 'sentiment')::DOUBLE PRECISION,
+    (f ->> 'positive_events')::DOUBLE PRECISION,
+    (f ->> 'negative_events')::DOUBLE PRECISION,
+    (f ->> 'GDP')::DOUBLE PRECISION,
+    (f ->> 'CPI')::DOUBLE PRECISION,
+    (f ->> 'FEDFUNDS')::DOUBLE PRECISION,
+    (f ->> 'UNRATE')::DOUBLE PRECISION,
+    (f ->> 'BAMLH0A0HYM2')::DOUBLE PRECISION,
+    (e ->> 'base_value')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'Close')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'High')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'Low')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'Open')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'Volume')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'trend_indicator')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'sentiment')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'positive_events')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'negative_events')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'GDP')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'CPI')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'FEDFUNDS')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'UNRATE')::DOUBLE PRECISION,
+    (e -> 'contributions' ->> 'BAMLH0A0HYM2')::DOUBLE PRECISION
+FROM (
+    -- json.dumps writes NaN and Infinity, which jsonb rejects; those values load as NULL
+    SELECT id, ticker, created_at, score, model_version,
+           regexp_replace(features::text, '-?\m(NaN|Infinity)\M', 'null', 'g')::jsonb AS f,
+           regexp_replace(explanation::text, '-?\m(NaN|Infinity)\M', 'null', 'g')::jsonb AS e
+    FROM credit_scores
+) AS scores
+WHERE NOT EXISTS (SELECT 1 FROM score_points LIMIT 1);
@@ -0,0 +1,57 @@
+# In: tests/test_tree_engine.py
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from lightgbm import LGBMRegressor
+from sklearn.ensemble import RandomForestRegressor
+from backend.tree_engine import CompiledEnsemble, compile_model
+
+DATASET = os.path.join(os.path.dirname(__file__), os.pardir, "training_dataset.csv")
+FEATURES = ['Close', 'High', 'Low', 'Open', 'Volume', 'trend_indicator', 'sentiment', 'positive_events',
+            'negative_events', 'GDP', 'CPI', 'FEDFUNDS', 'UNRATE', 'BAMLH0A0HYM2']
+TOLERANCE = 1e-12
+
+
+@pytest.fixture(scope="module")
+def training_data():
+    df = pd.read_csv(DATASET)
+    X = df[FEATURES].fillna(df[FEATURES].mean())
+    # Any target exercises the traversal; next-day returns give trees of realistic depth
+    y = df.groupby('ticker')['Close'].pct_change().shift(-1).fillna(0)
+    return X, y
+
+
+MODELS = {
+    "random_forest": lambda: RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0),
+    "lightgbm": lambda: LGBMRegressor(n_estimators=50, num_leaves=15, random_state=0, verbose=-1),
+}
+
+
+@pytest.mark.parametrize("name", MODELS)
+def test_compiled_predictions_match_the_estimator(training_data, name):
+    X, y = training_data
+    model = MODELS[name]().fit(X, y)
+    compiled = compile_model(model)
+    expected = model.predict(X)
+    np.testing.assert_allclose(compiled.predict(X.to_numpy(dtype='float64')), expected, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize("name", MODELS)
+def test_missing_values_follow_the_estimator(training_data, name):
+    X, y = training_data
+    model = MODELS[name]().fit(X, y)
+    rows = X.head(200).copy()
+    rows.iloc[::3, 0] = np.nan
+    rows.iloc[1::3, 6] = np.nan
+    expected = model.predict(rows)
+    np.testing.assert_allclose(compile_model(model).predict(rows.to_numpy(dtype='float64')), expected, rtol=0, atol=TOLERANCE)
+
+
+def test_saved_ensemble_predicts_the_same(training_data, tmp_path):
+    X, y = training_data
+    model = MODELS["lightgbm"]().fit(X, y)
+    compile_model(model).save(str(tmp_path / "model.compiled"))
+    loaded = CompiledEnsemble.load(str(tmp_path / "model.compiled"), mmap_mode='r')
+    np.testing.assert_allclose(loaded.predict(X.to_numpy(dtype='float64')), model.predict(X), rtol=0, atol=TOLERANCE)